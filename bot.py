@@ -1,14 +1,20 @@
 # bot.py (main entry point)
 
 import asyncio
+import sys
 import traceback
 
 import config
-from utils import logger, display, error_logger, rejection_log_file, VolatilePairScanner, rm_global
+from utils import logger, display, error_logger, log_flusher, close_logs, VolatilePairScanner, rm_global, failed_pair_tracker
 from order_manager import OrderManager
-from strategy import MomentumSniper
+from strategy import MomentumSniper, warm_up_indicators
 from ws_manager import WSManager
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 async def main():
     logger.info(f"🚀 Starting Momentum Sniper v8.7.1...")
     display.current_status = "Initializing..."
@@ -21,6 +27,8 @@ async def main():
     public_ws = WSManager(sniper, is_private=False)
     private_ws = WSManager(sniper, is_private=True)
     sniper.set_ws_managers(public_ws, private_ws)
+    warm_up_indicators()
+    tasks, render_task = [], None
 
     try:
         await order_manager.initialize_session()
@@ -32,6 +40,7 @@ async def main():
         if initial_movers:
             hot_pairs = [m["instId"] for m in initial_movers]
             sniper.hot_pairs = set(hot_pairs)
+            for inst_id in hot_pairs: sniper.register_pair(inst_id)
             display.hot_pairs = sorted(list(sniper.hot_pairs))
             display.sniper_ref = sniper
             public_ws.initial_pairs = hot_pairs
@@ -39,14 +48,18 @@ async def main():
         else:
             logger.warning("⚠️ Initial scan found no pairs! Check API connectivity.")
         
-        tasks = [
-            asyncio.create_task(sniper.run_tasks()),
-            asyncio.create_task(public_ws.run()),
-            asyncio.create_task(private_ws.run()),
-            asyncio.create_task(display.render_loop()),
-        ]
         display.current_status = "Running..."
-        await asyncio.gather(*tasks)
+        # The display runs outside the trading group so a render failure never tears down trading.
+        render_task = asyncio.create_task(display.render_loop())
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(sniper.run_tasks()),
+                tg.create_task(public_ws.run()),
+                tg.create_task(private_ws.run()),
+                tg.create_task(order_manager.keepalive_loop()),
+                tg.create_task(failed_pair_tracker.flusher()),
+                tg.create_task(log_flusher()),
+            ]
 
     except (KeyboardInterrupt, SystemExit) as e:
         logger.info(f"Shutdown requested ({type(e).__name__})...")
@@ -58,16 +71,23 @@ async def main():
         
         if 'public_ws' in locals() and public_ws: await public_ws.stop()
         if 'private_ws' in locals() and private_ws: await private_ws.stop()
+
+        # Only our own tasks are cancelled; aiohttp's connector/resolver tasks are left to close_session.
+        own_tasks = [t for t in (*tasks, render_task) if t and not t.done()]
+        for task in own_tasks: task.cancel()
+        if own_tasks: await asyncio.wait(own_tasks, timeout=2.0)
+
         if 'order_manager' in locals() and order_manager: await order_manager.close_session()
-        if rejection_log_file: rejection_log_file.close()
-            
-        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
-        [task.cancel() for task in tasks]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        close_logs()
+
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()]
+        if pending and config.DEBUG_MODE: logger.debug(f"{len(pending)} task(s) still pending at shutdown: {[t.get_coro().__qualname__ for t in pending]}")
         logger.info("Bot shut down cleanly.")
 
 if __name__ == "__main__":
+    loop_factory = uvloop.new_event_loop if uvloop and sys.platform != "win32" else None
     try:
-        asyncio.run(main())
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(main())
     except KeyboardInterrupt:
         logger.info("...shutdown complete.")
\ No newline at end of file
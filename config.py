@@ -71,6 +71,10 @@ EMA_SLOW = 13
 # Set to 0 for most aggressive scalping, 1 to require at least one confirmation.
 MIN_CONFIRMATIONS_NEEDED = 1
 ARMED_CANDIDATE_TIMEOUT_SEC = 20
+# Armed candidates are evaluated best-score first; at most this many per tick.
+CANDIDATE_EVAL_TOP_K = 3
+# Candidates whose score is older than this (in seconds) are re-scored before evaluation.
+CANDIDATE_RESCORE_SEC = 2.0
 
 # Z-score (short-term momentum)
 ZSCORE_WINDOW = 15
@@ -92,6 +96,12 @@ FEE_TAKER_BPS = 10
 FEE_MAKER_BPS = 8
 MAX_SLIPPAGE_BPS = 5
 ORDER_PENDING_TIMEOUT = 30
+# Longest monitor_position sleeps while a position is live; price/fill events wake it sooner.
+MONITOR_MAX_IDLE = 1.0
+
+# ---------- REST connection ----------
+# Interval (in seconds) between keepalive hits that keep the pooled HTTPS connection warm.
+REST_KEEPALIVE_INTERVAL_SEC = 30
 
 # ---------- TP / SL / Trailing (Micro-Scalper Tuning) ----------
 TP_ATR_MULTIPLIER = 4.0
@@ -127,19 +137,34 @@ CSV_LOG_TRADES = True
 CSV_LOG_PATH = "momentum_trades_v86.csv"
 ERROR_LOG_PATH = "momentum_errors_v86.log"
 LOG_ERRORS_TO_FILE = True
+# Repeats of the same error type+message within this window are counted but not written out again.
+ERROR_LOG_DEDUP_SEC = 5
 LOG_REJECTION_REASONS = True
 REJECTION_LOG_PATH = "rejections_v86.csv"
+# Error, trade and rejection log lines are buffered in memory and written out in one batch on this interval.
+LOG_FLUSH_SEC = 0.5
+# ...or as soon as any one log has this many characters pending.
+LOG_FLUSH_BYTES = 64 * 1024
 
 AUTO_EXCLUDE_FAILED_PAIRS = True
 MAX_FAILURES_PER_PAIR = 2
 EXCLUDED_PAIRS_FILE = "excluded_pairs_v86.json"
+EXCLUDED_PAIRS_FLUSH_SEC = 5
+# Cool-off expiry is re-checked at most this often (seconds)
+EXCLUDED_PAIRS_REFRESH_SEC = 5
 ERRORS_TO_IGNORE_FOR_COOLDOWN = []
 
 # ---------- Display ----------
 DISPLAY_MODE = "TUI"
+# Seconds between TUI repaints; kept coarse so rendering never competes with market data.
+DISPLAY_REFRESH_SEC = 1.0
+# Unchanged frames are skipped, but runtime/age counters are still refreshed at least this often.
+DISPLAY_FORCE_REFRESH_SEC = 5.0
 
 # ---------- WebSocket endpoints ----------
 WS_URL_DEMO_PUBLIC = "wss://wspap.okx.com:8443/ws/v5/public?brokerId=9999"
 WS_URL_DEMO_PRIVATE = "wss://wspap.okx.com:8443/ws/v5/private?brokerId=9999"
 WS_URL_LIVE_PUBLIC = "wss://ws.okx.com:8443/ws/v5/public"
-WS_URL_LIVE_PRIVATE = "wss://ws.okx.com:8443/ws/v5/private"
\ No newline at end of file
+WS_URL_LIVE_PRIVATE = "wss://ws.okx.com:8443/ws/v5/private"
+# Raw frames queued for the consumer before the reader stops pulling from the socket.
+WS_INBOX_MAXSIZE = 256
\ No newline at end of file
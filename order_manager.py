@@ -1,15 +1,15 @@
 # order_manager.py
 
-import json
 import hmac
 import base64
+import random
 import time
-from decimal import Decimal, ROUND_DOWN
+from decimal import Decimal
 from urllib.parse import urlencode
-from datetime import datetime, timezone
 import asyncio
 
 import aiohttp
+import orjson
 from aiohttp import TCPConnector
 
 import config
@@ -20,6 +20,21 @@ try:
 except ImportError:
     AsyncResolver = None
 
+_METHOD_BYTES = {"GET": b"GET", "POST": b"POST"}
+_PATH_CACHE_MAX = 128
+_CANCEL_ALGOS_MAX = 10
+# Retry backoff: exponential with jitter, slower for venue throttling/5xx than for network blips.
+_RETRY_BASE_SEC = 0.1
+_RETRY_NET_BASE_SEC = 0.05
+_RETRY_MAX_SEC = 2.0
+
+def _floor_units(n):
+    """int(n) for an amount already scaled to whole units; a float landing just under a unit (0.29 * 100 -> 28.999...) counts as that unit."""
+    if type(n) is float:
+        r = round(n)
+        if r > n and r - n <= 1e-9 * max(1.0, n): return r
+    return int(n)
+
 class OrderManager:
     def __init__(self):
         self.meta = {}
@@ -27,15 +42,26 @@ class OrderManager:
         self.session = None
         self.usdt_balance = Decimal("0")
         self.order_id_gen = order_id_gen
+        # Key pads are derived once; each signature just copies the prepared state.
+        self._hmac_template = hmac.new(config.API_SECRET.encode(), b"", "sha256")
+        self._path_cache = {}
+        self._pending_algo_cancels = []
+        self._algo_cancel_task = None
+        self._base_headers = {"Content-Type": "application/json", "OK-ACCESS-KEY": config.API_KEY, "OK-ACCESS-PASSPHRASE": config.API_PASSPHRASE}
+        if config.DEMO_TRADING == "1": self._base_headers["x-simulated-trading"] = "1"
 
     async def initialize_session(self):
-        connector = TCPConnector(resolver=AsyncResolver(), limit=80, ttl_dns_cache=600) if AsyncResolver else TCPConnector(limit=80, ttl_dns_cache=600)
+        connector = TCPConnector(
+            resolver=AsyncResolver() if AsyncResolver else None, limit=80, limit_per_host=32,
+            ttl_dns_cache=600, keepalive_timeout=75, enable_cleanup_closed=True, force_close=False,
+        )
         self.session = aiohttp.ClientSession(connector=connector)
         await self._sync_server_time()
         await self.load_instrument_meta()
         await self.update_balance()
 
     async def close_session(self):
+        if self._algo_cancel_task and not self._algo_cancel_task.done(): self._algo_cancel_task.cancel()
         if self.session and not self.session.closed:
             await self.session.close()
 
@@ -43,7 +69,7 @@ class OrderManager:
         try:
             async with self.session.get("https://www.okx.com/api/v5/public/time", timeout=aiohttp.ClientTimeout(total=5)) as resp:
                 if resp.status == 200:
-                    data = await resp.json(content_type=None)
+                    data = orjson.loads(await resp.read())
                     if data and data.get("code") == "0":
                         ts = float(data["data"][0]["ts"]) / 1000.0
                         self.time_offset = ts - time.time()
@@ -53,50 +79,66 @@ class OrderManager:
             error_logger.log_error("TIME_SYNC", "Failed to sync server time", str(e))
         logger.warning("⚠️ Time sync failed. Using system time.")
         self.time_offset = 0.0
+
+    async def keepalive_loop(self):
+        """Touches the public time endpoint so the pooled REST connection never idles out."""
+        while True:
+            await asyncio.sleep(config.REST_KEEPALIVE_INTERVAL_SEC)
+            if not self.session or self.session.closed: continue
+            try:
+                async with self.session.get("https://www.okx.com/api/v5/public/time", timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                    await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if config.DEBUG_MODE: logger.debug(f"REST keepalive failed: {e}")
         
-    @staticmethod
-    def _iso_timestamp(ts=None):
-        dt = datetime.fromtimestamp(ts if ts is not None else time.time(), tz=timezone.utc)
-        return dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    def _iso_timestamp(self, _time_ns=time.time_ns):
+        s, rem = divmod(_time_ns() + int(self.time_offset * 1e9), 1_000_000_000)
+        t = time.gmtime(s)
+        return f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}.{rem // 1_000_000:03d}Z"
 
-    @staticmethod
-    def _okx_sign(ts, method, path, body, secret):
-        prehash = f"{ts}{method.upper()}{path}{body}"
-        mac = hmac.new(secret.encode(), prehash.encode(), "sha256")
+    def sign(self, ts, method, path, body):
+        """OKX request signature (base64 HMAC-SHA256 of ts + method + path + body); also used for the WS login."""
+        method_bytes = _METHOD_BYTES.get(method) or method.upper().encode()
+        mac = self._hmac_template.copy()
+        mac.update(b"".join((ts.encode(), method_bytes, path.encode(), body)))
         return base64.b64encode(mac.digest()).decode()
 
     async def _make_request(self, method, path, params=None, body=None, retries=3):
-        full_path = f"{path}?{urlencode(sorted(params.items()), doseq=True)}" if params else path
+        key = (path, tuple(params.items()) if params else None)
+        full_path = self._path_cache.get(key)
+        if full_path is None:
+            full_path = f"{path}?{urlencode(params, doseq=True)}" if params else path
+            if len(self._path_cache) >= _PATH_CACHE_MAX: self._path_cache.pop(next(iter(self._path_cache)))
+            self._path_cache[key] = full_path
         url = f"https://www.okx.com{full_path}"
-        body_str = json.dumps(body) if body else ""
+        body_bytes = orjson.dumps(body) if body else b""
         for i in range(retries):
             try:
-                headers = {"Content-Type": "application/json"}
-                if config.DEMO_TRADING == "1": headers["x-simulated-trading"] = "1"
-                ts = self._iso_timestamp(time.time() + self.time_offset)
-                headers.update({
-                    "OK-ACCESS-KEY": config.API_KEY,
-                    "OK-ACCESS-SIGN": self._okx_sign(ts, method, full_path, body_str, config.API_SECRET),
-                    "OK-ACCESS-TIMESTAMP": ts,
-                    "OK-ACCESS-PASSPHRASE": config.API_PASSPHRASE,
-                })
+                ts = self._iso_timestamp()
+                headers = self._base_headers.copy()
+                headers["OK-ACCESS-SIGN"] = self.sign(ts, method, full_path, body_bytes)
+                headers["OK-ACCESS-TIMESTAMP"] = ts
                 async with self.session.request(
-                    method, url, headers=headers, data=body_str.encode("utf-8"),
+                    method, url, headers=headers, data=body_bytes,
                     timeout=aiohttp.ClientTimeout(total=10)
                 ) as response:
-                    if response.status != 200:
-                        logger.warning(f"API Error (attempt {i+1}/{retries}): Status {response.status} | {await response.text()}")
-                        await asyncio.sleep(0.5)
-                        continue
-                    return await response.json(content_type=None)
+                    if response.status == 200:
+                        raw = await response.read()
+                        return orjson.loads(raw) if raw else None
+                    logger.warning(f"API Error (attempt {i+1}/{retries}): Status {response.status} | {await response.text()}")
+                    # Other 4xx responses will not succeed on retry.
+                    if response.status != 429 and response.status < 500: return {"code": "-1", "msg": f"HTTP {response.status}"}
+                delay = min(_RETRY_MAX_SEC, _RETRY_BASE_SEC * 2 ** i) + random.random() * _RETRY_BASE_SEC
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 error_logger.log_error("NETWORK_ERROR", f"Request failed: {path}", str(e))
-                await asyncio.sleep(0.5)
+                delay = min(_RETRY_MAX_SEC, _RETRY_NET_BASE_SEC * 2 ** i) + random.random() * _RETRY_NET_BASE_SEC
+            if i + 1 < retries: await asyncio.sleep(delay)
         return {"code": "-1", "msg": "Max retries exceeded"}
 
-    def _dp_from_str(self, s):
-        if "e" in str(s).lower(): s = format(Decimal(s), "f")
-        return len(str(s).split(".")[1].rstrip("0")) if "." in str(s) else 0
+    @staticmethod
+    def _dp_from_str(s):
+        exp = Decimal(s).normalize().as_tuple().exponent
+        return max(0, -exp) if isinstance(exp, int) else 0
 
     async def load_instrument_meta(self):
         logger.info("Loading instrument metadata...")
@@ -106,9 +148,13 @@ class OrderManager:
         for d in res.get("data", []):
             if d.get("state") == "live" and d["instId"].endswith(f"-{config.QUOTE_CCY}"):
                 try:
+                    tick_sz, lot_sz = Decimal(d["tickSz"]), Decimal(d["lotSz"])
+                    tick_dp, lot_dp = self._dp_from_str(tick_sz), self._dp_from_str(lot_sz)
                     self.meta[d["instId"]] = {
-                        "tickDp": self._dp_from_str(d["tickSz"]), "lotDp": self._dp_from_str(d["lotSz"]),
-                        "minSz": float(d["minSz"]), "tickSz": Decimal(d["tickSz"]), "lotSz": Decimal(d["lotSz"]),
+                        "tickDp": tick_dp, "lotDp": lot_dp,
+                        "minSz": float(d["minSz"]), "tickSz": tick_sz, "lotSz": lot_sz,
+                        "tickScale": 10 ** tick_dp, "lotScale": 10 ** lot_dp,
+                        "tickInt": int(tick_sz * 10 ** tick_dp), "lotInt": int(lot_sz * 10 ** lot_dp),
                     }
                     count += 1
                 except: pass
@@ -124,8 +170,22 @@ class OrderManager:
                     return self.usdt_balance
         return self.usdt_balance
 
-    def _fmt_amount(self, x, dp):
-        return (x.quantize(Decimal(10) ** -dp, ROUND_DOWN).to_eng_string())
+    @staticmethod
+    def _fmt_scaled(n, dp, scale):
+        # n is an amount already expressed in units of 10**-dp.
+        if not dp: return str(n)
+        whole, frac = divmod(n, scale)
+        return f"{whole}.{frac:0{dp}d}"
+
+    def _fmt_fast(self, x, dp, scale):
+        return self._fmt_scaled(_floor_units(x * scale), dp, scale)
+
+    def price_to_ticks(self, inst_id, price):
+        """Price as an integer in units of 10**-tickDp, floored to a whole tick; None without metadata."""
+        md = self.meta.get(inst_id)
+        if not md: return None
+        tick_int = md["tickInt"] or 1
+        return (_floor_units(price * md["tickScale"]) // tick_int) * tick_int
 
     async def place_market_order(self, inst_id, side, amount, cl_ord_id, is_quote_amount=False):
         md = self.meta.get(inst_id)
@@ -133,7 +193,7 @@ class OrderManager:
         
         # FIX: For market buy, 'sz' is the quote currency amount (USDT).
         # For market sell, 'sz' is the base currency amount.
-        size_param = self._fmt_amount(amount, md["lotDp"])
+        size_param = self._fmt_fast(amount, md["lotDp"], md["lotScale"])
         if side == 'buy' and is_quote_amount:
             # OKX expects USDT amount for market buy size
             size_param = str(amount)
@@ -152,22 +212,28 @@ class OrderManager:
         return data.get("ordId"), None
 
     async def place_oco_order(self, inst_id, size, tp_price, sl_price, algo_cl_ord_id_base):
+        """tp_price/sl_price may be prices or ints from price_to_ticks computed ahead of time."""
         md = self.meta.get(inst_id)
         if not md: return None, "No metadata"
         
-        rounded_size = size.quantize(md["lotSz"], rounding=ROUND_DOWN)
+        lot_int = md["lotInt"] or 1
+        size_int = (int(size * md["lotScale"]) // lot_int) * lot_int
+        tp_ticks = tp_price if isinstance(tp_price, int) else self.price_to_ticks(inst_id, tp_price)
+        sl_ticks = sl_price if isinstance(sl_price, int) else self.price_to_ticks(inst_id, sl_price)
+        tp_px = self._fmt_scaled(tp_ticks, md["tickDp"], md["tickScale"])
+        sl_px = self._fmt_scaled(sl_ticks, md["tickDp"], md["tickScale"])
 
         payload = {
             "instId": inst_id, "tdMode": "cash", "side": "sell", "ordType": "oco",
-            "sz": self._fmt_amount(rounded_size, md["lotDp"]),
-            "tpTriggerPx": self._fmt_amount(tp_price, md["tickDp"]),
+            "sz": self._fmt_scaled(size_int, md["lotDp"], md["lotScale"]),
+            "tpTriggerPx": tp_px,
             "tpOrdPx": "-1",
-            "slTriggerPx": self._fmt_amount(sl_price, md["tickDp"]),
+            "slTriggerPx": sl_px,
             "slOrdPx": "-1",
             "algoClOrdId": algo_cl_ord_id_base
         }
         
-        logger.info(f"📤 Placing OCO order for {inst_id}: TP @ {tp_price:.6f}, SL @ {sl_price:.6f}")
+        logger.info(f"📤 Placing OCO order for {inst_id}: TP @ {tp_px}, SL @ {sl_px}")
         res = await self._make_request("POST", "/api/v5/trade/order-algo", body=payload)
 
         if res and res.get("code") == "0" and res.get("data") and res["data"][0].get("sCode") == "0":
@@ -181,15 +247,56 @@ class OrderManager:
 
     async def cancel_algo_order(self, inst_id, algo_id):
         if not algo_id: return None, "Invalid algo_id"
-        
-        payload = [{"instId": inst_id, "algoId": str(algo_id)}]
-        res = await self._make_request("POST", "/api/v5/trade/cancel-algos", body=payload)
-        
-        if not res or res.get("code") != "0": return None, res.get("msg", "API Error")
-        data = res.get("data", [{}])[0]
-        if data.get("sCode") != "0" and data.get("sCode") not in ["51300"]:
-            logger.warning(f"⚠️ Algo cancel failed for {algo_id}: {data.get('sMsg')}")
-            return None, data.get("sMsg", "Cancel failed")
-        
-        logger.info(f"✓ Algo order {algo_id} cancelled.")
-        return data.get("algoId"), None
\ No newline at end of file
+        # Cancels issued in the same loop pass (or while a batch is in flight) share one cancel-algos round-trip.
+        fut = asyncio.get_running_loop().create_future()
+        self._pending_algo_cancels.append((inst_id, str(algo_id), fut))
+        if self._algo_cancel_task is None or self._algo_cancel_task.done():
+            self._algo_cancel_task = asyncio.create_task(self._flush_algo_cancels())
+        return await fut
+
+    @staticmethod
+    def _resolve_algo_cancels(batch, results):
+        for _, algo_id, fut in batch:
+            if not fut.done(): fut.set_result(results.get(algo_id, (None, "Cancel failed")))
+
+    async def _flush_algo_cancels(self):
+        batch = []
+        try:
+            await asyncio.sleep(0)
+            while self._pending_algo_cancels:
+                batch, self._pending_algo_cancels = self._pending_algo_cancels, []
+                try: results = await self.cancel_algo_orders([(inst_id, algo_id) for inst_id, algo_id, _ in batch])
+                except Exception as e:
+                    error_logger.log_error("ALGO_CANCEL", "Batched algo cancel failed", str(e))
+                    results = {}
+                self._resolve_algo_cancels(batch, results)
+                batch = []
+        finally:
+            # Cancelled at shutdown: fail whatever was in flight or still queued so no caller waits forever.
+            batch, self._pending_algo_cancels = batch + self._pending_algo_cancels, []
+            self._resolve_algo_cancels(batch, {})
+
+    async def cancel_algo_orders(self, items):
+        """Cancels (inst_id, algo_id) pairs; returns {algo_id: (algo_id | None, error | None)}."""
+        items = [(inst_id, str(algo_id)) for inst_id, algo_id in items if algo_id]
+        outcomes = {}
+        for start in range(0, len(items), _CANCEL_ALGOS_MAX):
+            batch = items[start:start + _CANCEL_ALGOS_MAX]
+            payload = [{"instId": inst_id, "algoId": algo_id} for inst_id, algo_id in batch]
+            res = await self._make_request("POST", "/api/v5/trade/cancel-algos", body=payload)
+
+            # Partial failures come back with a non-zero code but still carry per-item sCodes.
+            data = res.get("data") if res else None
+            if not data:
+                msg = (res.get("msg") if res else None) or "API Error"
+                for _, algo_id in batch: outcomes[algo_id] = (None, msg)
+                continue
+            for d in data:
+                algo_id = d.get("algoId")
+                if d.get("sCode") != "0" and d.get("sCode") not in ["51300"]:
+                    logger.warning(f"⚠️ Algo cancel failed for {algo_id}: {d.get('sMsg')}")
+                    outcomes[algo_id] = (None, d.get("sMsg", "Cancel failed"))
+                    continue
+                logger.info(f"✓ Algo order {algo_id} cancelled.")
+                outcomes[algo_id] = (algo_id, None)
+        return outcomes
\ No newline at end of file
@@ -2,52 +2,187 @@
 # Corrected: Added missing 'datetime' import.
 
 import asyncio
+import heapq
 import time
 import traceback
-from collections import deque, defaultdict
+from collections import defaultdict, deque
 from decimal import Decimal
-from math import log as math_log
+from functools import lru_cache
+from math import inf, isnan, log
 from datetime import datetime # <--- FIX: ADDED MISSING IMPORT
 
+import numpy as np
+
 import config
-from utils import logger, error_logger, display, rm_global, trade_logger, safe_decimal, diagnostics
+from utils import logger, error_logger, display, rm_global, trade_logger, safe_decimal, diagnostics, RingBuffer
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return args[0] if args and callable(args[0]) else (lambda fn: fn)
+
+@njit(cache=True, fastmath=True)
+def _ema(arr, period):
+    k = 2.0 / (period + 1.0)
+    e = arr[0]
+    for i in range(1, arr.shape[0]): e = arr[i] * k + e * (1.0 - k)
+    return e
+
+@njit(cache=True, fastmath=True)
+def _zscore(rets):
+    if rets.shape[0] < 5: return 0.0
+    std = rets.std()
+    return 0.0 if std == 0.0 else (rets[-1] - rets.mean()) / std
+
+@njit(cache=True, fastmath=True)
+def compute_indicators(c, v, rets, ema_fast, ema_slow, z_win, vol_win, vol_spk):
+    """Returns (ema_fast, ema_slow, zscore, volume_spike_mult); NaN where history is too short."""
+    n = c.shape[0]
+    ema_f = ema_s = vol_mult = np.nan
+    zscore = 0.0
+
+    if n >= ema_fast: ema_f = _ema(c, ema_fast)
+    if n >= ema_slow: ema_s = _ema(c, ema_slow)
+
+    if n >= z_win and rets.shape[0] >= z_win - 1: zscore = _zscore(rets[rets.shape[0] - (z_win - 1):])
+
+    if n >= vol_win:
+        recent_vol = v[n - vol_spk:].sum()
+        base = v[n - vol_win:n - vol_spk]
+        base_sum = base.sum()
+        if base.shape[0] > 0 and base_sum > 0:
+            vol_mult = recent_vol / (base_sum / base.shape[0] * vol_spk)
+
+    return ema_f, ema_s, zscore, vol_mult
+
+@lru_cache(maxsize=512)
+def _D(x):
+    """Decimal(str(x)), memoized; for config values and prices that recur across calls."""
+    return Decimal(str(x))
+
+_D1, _D10000 = Decimal(1), Decimal(10000)
+
+# setup_scan status codes; anything >= _SETUP_NO_ATR means the breakout itself qualified.
+_SETUP_OK, _SETUP_NO_BREAKOUT, _SETUP_WEAK, _SETUP_NO_ATR, _SETUP_LOW_ATR, _SETUP_NO_EDGE, _SETUP_LOW_RR = 0, 1, 2, 3, 4, 5, 6
+
+# No fastmath here: the NaN checks on a still-warming ATR/rolling high must survive compilation.
+@njit(cache=True)
+def setup_scan(price, recent_high, atr, min_breakout_bps, min_atr_bps, tp_mult, sl_mult, cost_bps, min_rr):
+    """Returns (status, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr) for the latest close."""
+    breakout_bps = atr_bps = raw_tp_bps = raw_sl_bps = rr = 0.0
+    if price <= recent_high: return _SETUP_NO_BREAKOUT, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr
+    breakout_bps = (price - recent_high) / recent_high * 10000.0
+    if breakout_bps < min_breakout_bps: return _SETUP_WEAK, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr
+    if np.isnan(atr): return _SETUP_NO_ATR, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr
+
+    atr_bps = atr / price * 10000.0
+    if atr_bps < min_atr_bps: return _SETUP_LOW_ATR, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr
+    raw_tp_bps, raw_sl_bps = atr_bps * tp_mult, atr_bps * sl_mult
+    if raw_tp_bps - cost_bps <= 0.0 or raw_sl_bps <= 0.0: return _SETUP_NO_EDGE, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr
+    rr = (raw_tp_bps - cost_bps) / (raw_sl_bps + cost_bps)
+    if rr < min_rr: return _SETUP_LOW_RR, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr
+    return _SETUP_OK, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr
+
+def warm_up_indicators():
+    """Compiles (or loads from cache) the indicator kernel for the live array layout before trading starts."""
+    dummy = RingBuffer(config.BAR_HISTORY_MAX, 6)
+    for i in range(config.BAR_HISTORY_MAX): dummy.append((i, 1.0, 1.0 + (i % 3) * 1e-3, 1.0, 1.0 + (i % 5) * 1e-3, 1.0))
+    c, v = dummy.tail()[4:]
+    compute_indicators(c, v, np.diff(np.log(c)), config.EMA_FAST, config.EMA_SLOW, config.ZSCORE_WINDOW, config.VOLUME_AVG_WINDOW, config.VOLUME_SPIKE_WINDOW)
+    setup_scan(c[-1], c[-2], 1e-3, float(config.MIN_BREAKOUT_STRENGTH_BPS), float(config.MIN_ATR_BPS),
+               float(config.TP_ATR_MULTIPLIER), float(config.SL_ATR_MULTIPLIER), float(config.FEE_TAKER_BPS + config.MAX_SLIPPAGE_BPS),
+               float(config.MIN_RISK_REWARD_RATIO))
 
 class BarAggregator:
     """Aggregates real-time ticks into time-based bars (e.g., 1-second bars)."""
-    def __init__(self, order_manager, bar_period_sec=1.0, max_bars=400):
+    def __init__(self, order_manager, bar_period_sec=1.0, max_bars=400, lookback=8, atr_period=14):
         self.order_manager = order_manager
         self.bar_period = bar_period_sec
-        self.bars = deque(maxlen=max_bars)
-        self.current_bar = None
-        self.current_bar_start = 0
-        self.trade_volumes = []
-
-    def add_tick(self, price, volume=0):
-        """Adds a new price tick to the current bar or creates a new one."""
-        server_now = time.time() + self.order_manager.time_offset
-        bar_bucket = int(server_now / self.bar_period) * self.bar_period
-
-        if self.current_bar is None or bar_bucket > self.current_bar_start:
-            if self.current_bar:
-                total_vol = sum(self.trade_volumes) if self.trade_volumes else 0
-                self.bars.append((*self.current_bar, total_vol))
-            
-            self.current_bar_start = bar_bucket
-            self.current_bar = (bar_bucket, price, price, price, price)
-            self.trade_volumes = []
-
-        _, o, h, l, _ = self.current_bar
-        self.current_bar = (bar_bucket, o, max(h, price), min(l, price), price)
-        if volume > 0:
-            self.trade_volumes.append(volume)
-
-    def get_closes(self, n=None):
-        closes = [bar[4] for bar in self.bars]
-        return closes[-n:] if n else closes
+        self.lookback = lookback
+        self.atr_period = atr_period
+        self.atr = float("nan")  # Wilder ATR over closed bars, seeded with the SMA of the first atr_period TRs
+        self._tr_count = 0
+        self._tr_sum = 0.0
+        self._high_dq = deque()  # (bar seq, close), closes strictly decreasing; front is the window max
+        self._last_close = 0.0
+        self.bars = RingBuffer(max_bars, 6)  # columns: ts, o, h, l, c, v
+        self.logrets = RingBuffer(max_bars, 1)  # close-to-close log return, one per closed bar after the first
+        self.cur_bucket = -1
+        self._bucket_end = float("-inf")
+        # The open bar lives in plain float attributes; it only reaches the ring once it closes.
+        self.o = self.h = self.l = self.c = self.v = 0.0
+        self.bars_closed = 0
+        self._indicators_at = -1
+        self._indicators = None
+
+    def add_tick(self, price, volume=0, now=None):
+        """Adds a new price tick to the current bar or creates a new one; `now` is the caller's time.time(), if it has one."""
+        now = (time.time() if now is None else now) + self.order_manager.time_offset
+
+        if now >= self._bucket_end:
+            bucket = int(now // self.bar_period)
+            if bucket > self.cur_bucket:
+                if self.cur_bucket >= 0:
+                    self.bars.append((self.cur_bucket * self.bar_period, self.o, self.h, self.l, self.c, self.v))
+                    self.bars_closed += 1
+                    self._update_atr()
+                    if self.bars_closed > 1: self.logrets.append((log(self.c / self._last_close),))
+                    self._push_high(self.c)
+                self.cur_bucket = bucket
+                self._bucket_end = (bucket + 1) * self.bar_period
+                self.o = self.h = self.l = self.c = price
+                self.v = volume if volume > 0 else 0.0
+                return
 
-    def get_bars(self, n=None): return list(self.bars)[-n:] if n else list(self.bars)
+        if price > self.h: self.h = price
+        elif price < self.l: self.l = price
+        self.c = price
+        if volume > 0: self.v += volume
+
+    def _update_atr(self):
+        if self.bars_closed < 2: return
+        prev_c = self._last_close
+        tr = max(self.h - self.l, abs(self.h - prev_c), abs(self.l - prev_c))
+        n = self.atr_period
+        if self._tr_count < n:
+            self._tr_count += 1
+            self._tr_sum += tr
+            if self._tr_count == n: self.atr = self._tr_sum / n
+        else:
+            self.atr = (self.atr * (n - 1) + tr) / n
+
+    def _push_high(self, close):
+        # The window is the lookback - 1 closes before the newest one, so the previous close enters it now.
+        seq = self.bars_closed
+        dq = self._high_dq
+        if seq > 1:
+            while dq and dq[-1][1] <= self._last_close: dq.pop()
+            dq.append((seq - 1, self._last_close))
+        while dq and dq[0][0] <= seq - self.lookback: dq.popleft()
+        self._last_close = close
+
+    def rolling_high(self):
+        """Highest close over the lookback window, excluding the newest closed bar."""
+        return self._high_dq[0][1] if self._high_dq else float("nan")
+
+    # Zero-copy views of the newest n closed bars, oldest first.
+    def closes(self, n=None): return self.bars.tail(n)[4]
+    def highs(self, n=None): return self.bars.tail(n)[2]
+    def lows(self, n=None): return self.bars.tail(n)[3]
+    def volumes(self, n=None): return self.bars.tail(n)[5]
     def __len__(self): return len(self.bars)
 
+    def indicators(self):
+        """(ema_fast, ema_slow, zscore, volume_spike_mult) for the closed bars; recomputed once per bar."""
+        if self._indicators_at != self.bars_closed:
+            c, v = self.bars.tail()[4:]
+            self._indicators = compute_indicators(
+                c, v, self.logrets.tail()[0], config.EMA_FAST, config.EMA_SLOW, config.ZSCORE_WINDOW, config.VOLUME_AVG_WINDOW, config.VOLUME_SPIKE_WINDOW,
+            )
+            self._indicators_at = self.bars_closed
+        return self._indicators
+
 
 class MomentumSniper:
     def __init__(self, scanner, order_manager, risk_manager):
@@ -58,22 +193,47 @@ class MomentumSniper:
         self.pairs_data = {}
         self.active_position = None
         self.position_lock = asyncio.Lock()
+        self._position_event = asyncio.Event()  # wakes monitor_position on fills and wake_above/wake_below crossings
         self.public_ws = None
         self.private_ws = None
         self.hot_pairs = set()
         self.armed_candidates = {}
+        self._candidate_heap = []  # (checks, -score, scored_at, inst_id, armed_at)
+        self._scanned_bars = {}  # inst_id -> aggregator.bars_closed at the last setup scan
         self.last_setup_log = defaultdict(float)
-        self.bar_aggregators = defaultdict(lambda: BarAggregator(self.order_manager, config.BAR_SAMPLING_SEC, config.BAR_HISTORY_MAX))
+        self.bar_aggregators = {}  # only hot pairs; see register_pair()
+        # Config-derived constants for the per-tick paths, built once instead of per call.
+        self._setup_params = (float(config.MIN_BREAKOUT_STRENGTH_BPS), float(config.MIN_ATR_BPS), float(config.TP_ATR_MULTIPLIER),
+                              float(config.SL_ATR_MULTIPLIER), float(config.FEE_TAKER_BPS + config.MAX_SLIPPAGE_BPS),
+                              float(config.MIN_RISK_REWARD_RATIO))
+        self._dead_zone_frac = 1.0 - config.BREAKOUT_DEAD_ZONE_BPS / 10000
+        self._order_notional = _D(config.BASE_ORDER_NOTIONAL_USDT)
+        self._trail_activation_mult = _D1 + _D(config.TRAILING_ACTIVATION_BPS) / _D10000
+        self._trail_atr_mult = _D(config.TRAILING_DISTANCE_ATR_MULTIPLIER)
+        self._trail_min_frac = _D(config.TRAILING_DISTANCE_MIN_BPS) / _D10000
 
     def set_ws_managers(self, public_ws, private_ws):
         self.public_ws = public_ws
         self.private_ws = private_ws
 
+    def register_pair(self, inst_id):
+        if inst_id not in self.bar_aggregators:
+            self.bar_aggregators[inst_id] = BarAggregator(self.order_manager, config.BAR_SAMPLING_SEC, config.BAR_HISTORY_MAX,
+                                                          config.LOOKBACK_CANDLES, config.ATR_PERIOD)
+
+    def unregister_pair(self, inst_id):
+        self.bar_aggregators.pop(inst_id, None)
+        self._scanned_bars.pop(inst_id, None)
+        # Its book stops updating once unsubscribed; the heap entry is skipped once the candidate is gone.
+        self.armed_candidates.pop(inst_id, None)
+        if not (self.active_position and self.active_position["inst_id"] == inst_id): self.pairs_data.pop(inst_id, None)
+
     def _log_rejection(self, inst_id, stage, reason, details=""):
-        from utils import rejection_log_writer, rejection_log_file
+        from utils import rejection_log_writer
         log_key = f"{inst_id}-{stage}-{reason}"
-        if time.time() - self.last_setup_log[log_key] < 5: return
-        self.last_setup_log[log_key] = time.time()
+        now = time.monotonic()
+        if now - self.last_setup_log[log_key] < 5: return
+        self.last_setup_log[log_key] = now
         
         display.signals_rejected += 1
         if not config.LOG_REJECTION_REASONS or not rejection_log_writer: return
@@ -81,25 +241,8 @@ class MomentumSniper:
         ts = datetime.now().strftime("%H:%M:%S")
         try:
             rejection_log_writer.writerow([ts, inst_id, stage, reason, details])
-            if rejection_log_file: rejection_log_file.flush()
         except: pass
 
-    def compute_ema(self, values, period):
-        if len(values) < period: return None
-        k = 2.0 / (period + 1.0)
-        ema = values[0]
-        for v in values[1:]: ema = (v * k) + (ema * (1.0 - k))
-        return Decimal(str(ema))
-
-    def compute_zscore(self, returns):
-        if len(returns) < 5: return 0.0
-        try:
-            arr = [float(r) for r in returns]
-            mean, var = sum(arr) / len(arr), sum((x - mean) ** 2 for x in arr) / len(arr)
-            std = var**0.5 if var > 0 else 1e-9
-            return (arr[-1] - mean) / std
-        except: return 0.0
-
     async def check_setup_conditions(self, inst_id):
         try:
             aggregator = self.bar_aggregators.get(inst_id)
@@ -107,81 +250,109 @@ class MomentumSniper:
 
             if inst_id in self.armed_candidates: return
 
-            closes = aggregator.get_closes()
-            if len(closes) < config.MIN_CANDLES_FOR_ENTRY: return
-
+            ema_fast, ema_slow, _, _ = aggregator.indicators()
+            atr_f = aggregator.atr
             if config.REQUIRE_EMA_CROSS:
-                ema_fast, ema_slow = self.compute_ema(closes, config.EMA_FAST), self.compute_ema(closes, config.EMA_SLOW)
-                if not ema_fast or not ema_slow: return
+                if isnan(ema_fast) or isnan(ema_slow) or not ema_fast or not ema_slow: return
                 if ema_fast <= ema_slow: return
 
-            current_price = Decimal(str(closes[-1]))
-            lookback_closes = closes[-config.LOOKBACK_CANDLES:]
-            if len(lookback_closes) < 2: return
-            
-            recent_high = Decimal(str(max(lookback_closes[:-1])))
+            if config.LOOKBACK_CANDLES < 2 or len(aggregator) < 2: return
+
+            # A NaN ATR is left to the kernel (_SETUP_NO_ATR), so dead-zone/breakout rejections are still counted during warm-up.
+            recent_high = aggregator.rolling_high()
+            if isnan(recent_high): return
+            current_price = float(aggregator.closes(1)[0])
+            status, recent_high, breakout_bps, atr_bps, raw_tp_bps, raw_sl_bps, rr = setup_scan(
+                current_price, recent_high, atr_f, *self._setup_params)
 
             if config.BREAKOUT_DEAD_ZONE_BPS > 0:
                 pd = self.pairs_data.get(inst_id, {})
-                last_armed_high = pd.get('last_armed_high', Decimal(0))
-                if recent_high == last_armed_high:
-                    dead_zone_price = recent_high * (Decimal(1) - Decimal(str(config.BREAKOUT_DEAD_ZONE_BPS)) / Decimal(10000))
+                if recent_high == pd.get('last_armed_high', 0.0):
+                    dead_zone_price = recent_high * self._dead_zone_frac
                     if current_price > dead_zone_price:
-                        self._log_rejection(inst_id, "Setup", "In Dead Zone", f"C:{float(current_price):.6f} > DZ:{float(dead_zone_price):.6f}")
+                        self._log_rejection(inst_id, "Setup", "In Dead Zone", f"C:{current_price:.6f} > DZ:{dead_zone_price:.6f}")
                         return
 
-            if current_price <= recent_high:
-                self._log_rejection(inst_id, "Setup", "No Breakout", f"C:{float(current_price):.6f}<=H{float(recent_high):.6f}")
+            if status == _SETUP_NO_BREAKOUT:
+                self._log_rejection(inst_id, "Setup", "No Breakout", f"C:{current_price:.6f}<=H{recent_high:.6f}")
                 return
-
-            breakout_bps = (current_price - recent_high) / recent_high * 10000
-            if breakout_bps < Decimal(str(config.MIN_BREAKOUT_STRENGTH_BPS)):
-                self._log_rejection(inst_id, "Setup", "Weak Breakout", f"{float(breakout_bps):.2f}bps")
+            if status == _SETUP_WEAK:
+                self._log_rejection(inst_id, "Setup", "Weak Breakout", f"{breakout_bps:.2f}bps")
                 return
-            
+
             if config.BREAKOUT_DEAD_ZONE_BPS > 0:
                 if inst_id not in self.pairs_data: self.pairs_data[inst_id] = {}
                 self.pairs_data[inst_id]['last_armed_high'] = recent_high
-            
-            bars = aggregator.get_bars(config.ATR_PERIOD + 1)
-            if len(bars) < config.ATR_PERIOD + 1: return
-            
-            trs = [max(curr[2] - curr[3], abs(curr[2] - prev[4]), abs(curr[3] - prev[4])) for prev, curr in zip(bars, bars[1:])]
-            if not trs: return
 
-            atr = Decimal(str(sum(trs) / len(trs)))
-            atr_bps = (atr / current_price) * 10000
-            if atr_bps < Decimal(str(config.MIN_ATR_BPS)):
-                self._log_rejection(inst_id, "Setup", "Low ATR", f"{float(atr_bps):.2f}bps")
+            if status == _SETUP_NO_ATR: return
+            if status == _SETUP_LOW_ATR:
+                self._log_rejection(inst_id, "Setup", "Low ATR", f"{atr_bps:.2f}bps")
                 return
-
-            tp_dist, sl_dist = atr * Decimal(str(config.TP_ATR_MULTIPLIER)), atr * Decimal(str(config.SL_ATR_MULTIPLIER))
-            raw_tp_bps, raw_sl_bps = float((tp_dist / current_price) * 10000), float((sl_dist / current_price) * 10000)
-            
-            expected_cost_bps = config.FEE_TAKER_BPS + config.MAX_SLIPPAGE_BPS
-            if (raw_tp_bps - expected_cost_bps) <= 0 or raw_sl_bps <= 0: return
-
-            rr = (raw_tp_bps - expected_cost_bps) / (raw_sl_bps + expected_cost_bps)
-            if rr < config.MIN_RISK_REWARD_RATIO:
+            if status == _SETUP_LOW_RR:
                 self._log_rejection(inst_id, "Setup", "Low R:R", f"rr={rr:.2f}")
                 return
+            if status != _SETUP_OK: return
 
             tp_bps_adj = max(config.MIN_TP_BPS, min(config.MAX_TP_BPS, raw_tp_bps))
             sl_bps_adj = max(config.MIN_SL_BPS, min(config.MAX_SL_BPS, raw_sl_bps))
-            
-            self.armed_candidates[inst_id] = {
+
+            candidate = {
                 "entry_price": current_price,
-                "tp": current_price * (Decimal("1") + Decimal(str(tp_bps_adj)) / Decimal("10000")),
-                "sl": current_price * (Decimal("1") - Decimal(str(sl_bps_adj)) / Decimal("10000")),
-                "tp_bps": tp_bps_adj, "sl_bps": sl_bps_adj, "atr": float(atr),
-                "breakout_strength": float(breakout_bps), "rr": rr, "time": time.time(),
+                "tp": current_price * (1.0 + tp_bps_adj / 10000),
+                "sl": current_price * (1.0 - sl_bps_adj / 10000),
+                "tp_bps": tp_bps_adj, "sl_bps": sl_bps_adj, "atr": atr_f,
+                "breakout_strength": breakout_bps, "rr": rr, "time": time.monotonic(),
             }
+            self.armed_candidates[inst_id] = candidate
+            heapq.heappush(self._candidate_heap, (0, -self._candidate_score(inst_id, candidate), candidate["time"], inst_id, candidate["time"]))
             logger.info(f"🔎 SETUP FOUND: {inst_id} armed. Awaiting execution trigger...")
         except Exception as e:
             if inst_id in self.pairs_data: self.pairs_data[inst_id].pop('last_armed_high', None)
-            error_logger.log_error("SETUP_SCAN", f"Error for {inst_id}", traceback.format_exc(e))
+            error_logger.log_error("SETUP_SCAN", f"Error for {inst_id}", traceback.format_exc())
+
+    def _candidate_score(self, inst_id, candidate):
+        """Breakout strength x R:R x volume spike, per bp of spread; higher is evaluated first."""
+        score = candidate["breakout_strength"] * candidate["rr"]
+        aggregator = self.bar_aggregators.get(inst_id)
+        if aggregator:
+            mult = aggregator.indicators()[3]
+            if not isnan(mult) and mult > 0: score *= mult
+        pd = self.pairs_data.get(inst_id, {})
+        if pd.get("best_ask"):
+            spread_bps = (pd["best_ask"] - pd["best_bid"]) / pd["best_ask"] * 10000
+            score /= max(spread_bps, 0.1)
+        return score
+
+    async def evaluate_candidates(self):
+        """Runs execution checks over armed candidates whose book moved since their last check; fewest checks first, then best score."""
+        now, drained, held = time.monotonic(), [], []
+        while self._candidate_heap and len(drained) < config.CANDIDATE_EVAL_TOP_K:
+            entry = heapq.heappop(self._candidate_heap)
+            checks, _, scored_at, inst_id, armed_at = entry
+            candidate = self.armed_candidates.get(inst_id)
+            if not candidate or candidate["time"] != armed_at: continue
+            if now - scored_at > config.CANDIDATE_RESCORE_SEC:
+                heapq.heappush(self._candidate_heap, (checks, -self._candidate_score(inst_id, candidate), now, inst_id, armed_at))
+                continue
+            book_seq = self.pairs_data.get(inst_id, {}).get("book_seq", 0)
+            if book_seq == candidate.get("checked_seq"): held.append(entry)
+            else: drained.append((entry, book_seq))
+        for entry in held: heapq.heappush(self._candidate_heap, entry)
+
+        for n, (entry, book_seq) in enumerate(drained):
+            checks, neg_score, scored_at, inst_id, armed_at = entry
+            self.armed_candidates[inst_id]["checked_seq"] = book_seq
+            entered = await self.check_execution_conditions(inst_id)
+            candidate = self.armed_candidates.get(inst_id)
+            # Re-queued behind every candidate with fewer checks, so lower-ranked setups still get their turn.
+            if candidate and candidate["time"] == armed_at: heapq.heappush(self._candidate_heap, (checks + 1, neg_score, scored_at, inst_id, armed_at))
+            if entered:
+                # active_position is only set inside the entry task, so stop here rather than consume setups it would drop.
+                for rest, _ in drained[n + 1:]: heapq.heappush(self._candidate_heap, rest)
+                break
 
     async def check_execution_conditions(self, inst_id):
+        """True once the candidate has been handed to enter_position."""
         try:
             if inst_id not in self.armed_candidates: return
             pd = self.pairs_data.get(inst_id)
@@ -190,8 +361,7 @@ class MomentumSniper:
                 if self.active_position: return
                 candidate = self.armed_candidates.get(inst_id)
                 if not candidate: return
-                now = time.time()
-                if now - candidate.get("time", 0) > config.ARMED_CANDIDATE_TIMEOUT_SEC:
+                if time.monotonic() - candidate.get("time", 0) > config.ARMED_CANDIDATE_TIMEOUT_SEC:
                     del self.armed_candidates[inst_id]
                     self._log_rejection(inst_id, "Execution", "Stale Candidate")
                     return
@@ -200,41 +370,29 @@ class MomentumSniper:
                     self._log_rejection(inst_id, "Execution", "Risk", reason)
                     return
                 spread_pct = (pd["best_ask"] - pd["best_bid"]) / pd["best_ask"] * 100
-                if spread_pct > Decimal(str(config.MAX_SPREAD_PCT)):
-                    self._log_rejection(inst_id, "Execution", "Wide Spread", f"{float(spread_pct):.3f}%")
+                if spread_pct > config.MAX_SPREAD_PCT:
+                    self._log_rejection(inst_id, "Execution", "Wide Spread", f"{spread_pct:.3f}%")
                     return
                 confirmations = 0
                 reasons = []
                 aggregator = self.bar_aggregators.get(inst_id)
-                if aggregator and len(aggregator) >= config.ZSCORE_WINDOW:
-                    closes = aggregator.get_closes(config.ZSCORE_WINDOW)
-                    if len(closes) > 1:
-                        rets = [math_log(closes[i] / closes[i - 1]) for i in range(1, len(closes)) if closes[i - 1] > 0]
-                        if rets:
-                            z_score = self.compute_zscore(rets)
-                            if abs(z_score) >= config.ZSCORE_THRESHOLD:
-                                confirmations += 1
-                                reasons.append(f"ZOK({z_score:.2f})")
-                
-                if aggregator and len(aggregator) >= config.VOLUME_AVG_WINDOW:
-                    volumes = [b[5] for b in aggregator.get_bars(config.VOLUME_AVG_WINDOW)]
-                    if len(volumes) >= config.VOLUME_AVG_WINDOW:
-                        recent_vol = sum(volumes[-config.VOLUME_SPIKE_WINDOW:])
-                        base_vols = volumes[:-config.VOLUME_SPIKE_WINDOW]
-                        if base_vols and sum(base_vols) > 0:
-                            avg_base_vol = sum(base_vols) / len(base_vols)
-                            if avg_base_vol > 0:
-                                mult = recent_vol / (avg_base_vol * config.VOLUME_SPIKE_WINDOW)
-                                if mult >= config.VOLUME_SPIKE_MULTIPLIER:
-                                    confirmations += 1
-                                    reasons.append(f"VolOK(x{mult:.1f})")
-
-                bids, asks = pd["order_book"]["bids"], pd["order_book"]["asks"]
-                if bids and asks:
-                    bid_vol = sum(Decimal(b[1])*Decimal(b[0]) for b in bids)
-                    ask_vol = sum(Decimal(a[1])*Decimal(a[0]) for a in asks)
-                    if ask_vol > 0 and bid_vol >= Decimal(str(config.MIN_BID_DEPTH_USDT)):
-                        imb = float(bid_vol / ask_vol)
+                if aggregator:
+                    _, _, z_score, mult = aggregator.indicators()
+                    if len(aggregator) >= config.ZSCORE_WINDOW and abs(z_score) >= config.ZSCORE_THRESHOLD:
+                        confirmations += 1
+                        reasons.append(f"ZOK({z_score:.2f})")
+                    if not isnan(mult) and mult >= config.VOLUME_SPIKE_MULTIPLIER:
+                        confirmations += 1
+                        reasons.append(f"VolOK(x{mult:.1f})")
+
+                book = pd["order_book"]
+                bids, asks = book["bids"], book["asks"]
+                if len(bids) and len(asks):
+                    # Depth is cached on the book dict, which handle_bbo_data replaces on every update.
+                    if "depth" not in book: book["depth"] = (float(bids[:, 0] @ bids[:, 1]), float(asks[:, 0] @ asks[:, 1]))
+                    bid_vol, ask_vol = book["depth"]
+                    if ask_vol > 0 and bid_vol >= config.MIN_BID_DEPTH_USDT:
+                        imb = bid_vol / ask_vol
                         if config.MIN_IMBALANCE <= imb <= config.MAX_IMBALANCE:
                             confirmations += 1
                             reasons.append(f"ImbOK({imb:.2f})")
@@ -248,45 +406,52 @@ class MomentumSniper:
                 
                 signal["imbalance"] = float(imb) if 'imb' in locals() else 0
                 display.signals_detected += 1
-                logger.info(f"🎯 EXECUTION {inst_id} @ {float(pd['mid']):.6f} | {','.join(reasons)}")
+                logger.info(f"🎯 EXECUTION {inst_id} @ {pd['mid']:.6f} | {','.join(reasons)}")
                 asyncio.create_task(self.enter_position(inst_id, signal))
+                return True
         except Exception as e:
             if inst_id in self.armed_candidates: del self.armed_candidates[inst_id]
             error_logger.log_error("EXEC_TRIGGER", f"Error for {inst_id}", traceback.format_exc())
 
-    async def handle_bbo_data(self, inst_id, bbo_data_list):
+    async def handle_bbo_data(self, inst_id, best_bid, best_ask, bids, asks):
+        """bids/asks are (N, 2) float64 [px, sz] arrays, already parsed by the WS layer."""
         diagnostics.record_message("bbo-tbt", inst_id)
-        if not bbo_data_list: return
-            
-        try:
-            bbo_data = bbo_data_list[0]
-            bids, asks = bbo_data.get('bids'), bbo_data.get('asks')
-            if not bids or not asks or not bids[0] or not asks[0]: return
-
-            if inst_id not in self.pairs_data: self.pairs_data[inst_id] = {}
-
-            best_bid_px, best_ask_px = Decimal(bids[0][0]), Decimal(asks[0][0])
-            self.pairs_data[inst_id].update({
-                "best_bid": best_bid_px, "best_ask": best_ask_px, "mid": (best_bid_px + best_ask_px) / 2,
-                "order_book": {"bids": bids, "asks": asks}
-            })
-
-            mid_price = float((best_bid_px + best_ask_px) / 2)
-            if mid_price > 0:
-                self.bar_aggregators[inst_id].add_tick(mid_price)
-                await asyncio.sleep(0)
-                asyncio.create_task(self.check_setup_conditions(inst_id))
-                asyncio.create_task(self.check_execution_conditions(inst_id))
-        except (KeyError, IndexError, ValueError, TypeError) as e:
-            if config.DEBUG_MODE: logger.debug(f"Error parsing BBO for {inst_id}: {e} | Data: {bbo_data_list}")
+        aggregator = self.bar_aggregators.get(inst_id)
+        if aggregator is None: return
+        if inst_id not in self.pairs_data: self.pairs_data[inst_id] = {}
+
+        mid_price = (best_bid + best_ask) / 2
+        pd = self.pairs_data[inst_id]
+        pd.update({
+            "best_bid": best_bid, "best_ask": best_ask, "mid": mid_price,
+            "order_book": {"bids": bids, "asks": asks}, "book_seq": pd.get("book_seq", 0) + 1,
+        })
+
+        pos = self.active_position
+        if pos and pos["inst_id"] == inst_id and (mid_price > pos.get("wake_above", inf) or mid_price <= pos.get("wake_below", -inf)):
+            self._position_event.set()
+
+        if mid_price > 0:
+            aggregator.add_tick(mid_price, now=time.time())
+            asyncio.create_task(self._on_tick(inst_id))
+
+    async def _on_tick(self, inst_id):
+        """Setup scan then execution checks for one BBO update, as a single task."""
+        # The scan only reads closed bars, so it can only change outcome once a new bar has closed.
+        aggregator = self.bar_aggregators.get(inst_id)
+        if aggregator and self._scanned_bars.get(inst_id) != aggregator.bars_closed:
+            self._scanned_bars[inst_id] = aggregator.bars_closed
+            await self.check_setup_conditions(inst_id)
+        await self.evaluate_candidates()
 
     async def handle_trade_data(self, inst_id, trades):
         diagnostics.record_message("trades", inst_id)
-        aggregator = self.bar_aggregators[inst_id]
+        aggregator, now = self.bar_aggregators.get(inst_id), time.time()
+        if aggregator is None: return
         for tr in trades:
             try:
                 price = float(tr["px"])
-                if price > 0: aggregator.add_tick(price, float(tr["sz"]))
+                if price > 0: aggregator.add_tick(price, float(tr["sz"]), now)
             except: continue
 
     async def handle_account_update(self, data):
@@ -317,6 +482,7 @@ class MomentumSniper:
                     })
                     logger.info(f"✅ ENTRY FILLED: {pos['inst_id']} | Size: {pos['entry_size']} @ ${float(pos['entry_price']):.6f}")
                     display.active_position = pos
+                    self._position_event.set()
 
                 elif (is_tpsl_fill or is_manual_exit_fill) and pos.get("state") == "OPEN":
                     if is_tpsl_fill:
@@ -339,16 +505,18 @@ class MomentumSniper:
             if self.active_position: return
             
             await self.order_manager.update_balance()
-            if self.order_manager.usdt_balance < Decimal(str(config.BASE_ORDER_NOTIONAL_USDT)):
+            if self.order_manager.usdt_balance < self._order_notional:
                 logger.warning(f"⚠️ Insufficient balance: ${self.order_manager.usdt_balance}")
                 return
             
-            size_base = Decimal(str(config.BASE_ORDER_NOTIONAL_USDT)) / signal["entry_price"]
+            # Signals are computed in float; Decimal starts here, at the order boundary.
+            entry_price, tp_price, sl_price = Decimal(str(signal["entry_price"])), Decimal(str(signal["tp"])), Decimal(str(signal["sl"]))
+            size_base = self._order_notional / entry_price
             entry_cl_ord_id = self.order_manager.order_id_gen.generate(inst_id)
             
             entry_ord_id, attach_algo_id, error = await self.order_manager.place_order_with_tpsl(
-                inst_id=inst_id, side="buy", size=size_base, tp_price=signal["tp"],
-                sl_price=signal["sl"], cl_ord_id=entry_cl_ord_id
+                inst_id=inst_id, side="buy", size=size_base, tp_price=tp_price,
+                sl_price=sl_price, cl_ord_id=entry_cl_ord_id
             )
             
             if error:
@@ -357,16 +525,19 @@ class MomentumSniper:
             
             self.active_position = {
                 "inst_id": inst_id, "entry_order_id": entry_ord_id, "clOrdId": entry_cl_ord_id,
-                "attach_algo_id": attach_algo_id, "tp_price": signal["tp"], "sl_price": signal["sl"],
+                "attach_algo_id": attach_algo_id, "tp_price": tp_price, "sl_price": sl_price,
                 "tp_bps": signal["tp_bps"], "sl_bps": signal["sl_bps"], "atr": signal["atr"],
                 "rr": signal.get("rr", 0), "time": time.time(), "state": "PENDING_ENTRY"
             }
             display.active_position = self.active_position
+            self._position_event.set()
             logger.info(f"✅ Position pending for {inst_id} with attached TP/SL.")
 
     async def monitor_position(self):
         while True:
-            await asyncio.sleep(1.0)
+            try: await asyncio.wait_for(self._position_event.wait(), config.MONITOR_MAX_IDLE if self.active_position else None)
+            except asyncio.TimeoutError: pass
+            self._position_event.clear()
             if not self.active_position: continue
 
             async with self.position_lock:
@@ -389,8 +560,9 @@ class MomentumSniper:
                     continue
                 
                 if pos.get("state") == "OPEN":
-                    current_price = self.pairs_data.get(inst_id, {}).get("mid")
-                    if not current_price: continue
+                    mid = self.pairs_data.get(inst_id, {}).get("mid")
+                    if not mid: continue
+                    current_price = _D(mid)
 
                     pos["current"] = current_price
                     
@@ -402,7 +574,7 @@ class MomentumSniper:
                         if "peak_price" not in pos or not pos["peak_price"]: pos["peak_price"] = pos["entry_price"]
                         if current_price > pos["peak_price"]: pos["peak_price"] = current_price
                         
-                        activation_price = pos["entry_price"] * (Decimal("1") + Decimal(str(config.TRAILING_ACTIVATION_BPS)) / Decimal("10000"))
+                        activation_price = pos["entry_price"] * self._trail_activation_mult
                         if not pos.get("trailing_active") and current_price >= activation_price:
                             pos["trailing_active"] = True
                             logger.info(f"📈 Trailing stop ACTIVATED for {inst_id}")
@@ -412,10 +584,14 @@ class MomentumSniper:
                                 pos['attach_algo_id'] = None
                         
                         if pos.get("trailing_active"):
-                            trail_dist = max(Decimal(str(pos.get("atr", 0))) * Decimal(str(config.TRAILING_DISTANCE_ATR_MULTIPLIER)), pos["entry_price"] * Decimal(str(config.TRAILING_DISTANCE_MIN_BPS)) / Decimal("10000"))
+                            trail_dist = max(_D(pos.get("atr", 0)) * self._trail_atr_mult, pos["entry_price"] * self._trail_min_frac)
                             if current_price <= pos["peak_price"] - trail_dist:
                                 await self.force_close_position("TRAILING_STOP")
                                 continue
+                            # Wake on a new peak (to ratchet the stop) or on the stop itself.
+                            pos["wake_above"], pos["wake_below"] = float(pos["peak_price"]), float(pos["peak_price"] - trail_dist)
+                        else:
+                            pos["wake_above"] = float(activation_price)
 
     async def force_close_position(self, reason):
         if not self.active_position or self.active_position.get("state") != "OPEN": return
@@ -477,8 +653,10 @@ class MomentumSniper:
                 hot_pairs = {m["instId"] for m in movers}
                 newly_hot = hot_pairs - self.hot_pairs
                 newly_cold = self.hot_pairs - hot_pairs
+                for inst_id in newly_hot: self.register_pair(inst_id)
                 if newly_hot and self.public_ws: await self.public_ws.subscribe(list(newly_hot))
                 if newly_cold and self.public_ws: await self.public_ws.unsubscribe(list(newly_cold))
+                for inst_id in newly_cold: self.unregister_pair(inst_id)
                 self.hot_pairs = hot_pairs
                 display.hot_pairs = sorted(list(self.hot_pairs))
             except Exception as e:
@@ -8,11 +8,14 @@ import os
 import sys
 import time
 import traceback
+from array import array
 from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 
 import aiohttp
+import numpy as np
 from aiohttp import TCPConnector
 
 import config
@@ -25,8 +28,19 @@ class CleanFormatter(logging.Formatter):
         logging.ERROR: "❌ %(message)s",
         logging.CRITICAL: "🚨 %(message)s",
     }
+    def __init__(self):
+        super().__init__()
+        self._fmts = {level: logging.Formatter(fmt) for level, fmt in self.FORMATS.items()}
+        self._default = logging.Formatter("%(message)s")
     def format(self, record):
-        return logging.Formatter(self.FORMATS.get(record.levelno)).format(record)
+        return self._fmts.get(record.levelno, self._default).format(record)
+
+class ConsoleActivity(logging.Filter):
+    """Counts records reaching the console so the TUI knows when its rows were scrolled away."""
+    records = 0
+    def filter(self, record):
+        ConsoleActivity.records += 1
+        return True
 
 def setup_logger():
     logger = logging.getLogger()
@@ -35,6 +49,7 @@ def setup_logger():
         logger.removeHandler(h)
     console = logging.StreamHandler()
     console.setFormatter(CleanFormatter())
+    console.addFilter(ConsoleActivity())
     logger.addHandler(console)
     try:
         file_handler = logging.FileHandler('bot_runtime.log', mode='a', encoding='utf-8')
@@ -45,38 +60,109 @@ def setup_logger():
         logger.error(f"❌ Failed to initialize file logger: {e}")
     logging.getLogger("websockets").setLevel(logging.WARNING)
     logging.getLogger("aiohttp").setLevel(logging.WARNING)
+    logging.getLogger("numba").setLevel(logging.WARNING)
     return logger
 
 logger = setup_logger()
 
+# One worker keeps log and state-file writes ordered and off the event-loop thread.
+_io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-io")
+# Set once any writer has LOG_FLUSH_BYTES pending, so bursts are written out before the interval elapses.
+_flush_due = asyncio.Event()
+
+class BackgroundWriter:
+    """Append-only text file behind one persistent handle; write() only buffers, flush() writes the batch."""
+    _instances = []
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "a", encoding="utf-8", newline="", buffering=1 << 16)
+        self._pending = []
+        self._size = 0
+        BackgroundWriter._instances.append(self)
+    def write(self, text):  # also lets csv.writer target this object directly
+        self._pending.append(text)
+        self._size += len(text)
+        if self._size >= config.LOG_FLUSH_BYTES: _flush_due.set()
+    def take(self):
+        """Detaches the pending lines as one string; called on the loop thread so no write() can be lost."""
+        lines, self._pending, self._size = self._pending, [], 0
+        return "".join(lines)
+    def _write_out(self, text):
+        if self._fh.closed: return
+        self._fh.write(text)
+        self._fh.flush()
+    def flush(self):
+        if self._pending: self._write_out(self.take())
+    def close(self):
+        if self._fh.closed: return
+        self.flush()
+        self._fh.close()
+
+async def log_flusher():
+    """Writes out every BackgroundWriter's buffered lines once per LOG_FLUSH_SEC (or LOG_FLUSH_BYTES), on the IO thread."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try: await asyncio.wait_for(_flush_due.wait(), config.LOG_FLUSH_SEC)
+        except asyncio.TimeoutError: pass
+        _flush_due.clear()
+        for w in BackgroundWriter._instances:
+            text = w.take()
+            if not text: continue
+            try: await loop.run_in_executor(_io_pool, w._write_out, text)
+            except Exception as e: logger.warning(f"Log flush failed for {w.path}: {e}")
+
+def close_logs():
+    """Drains the IO worker first so the final synchronous writes can't interleave with a queued one."""
+    _io_pool.shutdown(wait=True)
+    failed_pair_tracker.flush()
+    for w in BackgroundWriter._instances:
+        try: w.close()
+        except Exception: pass
+
 class ErrorLogger:
     def __init__(self):
         self.recent_errors = deque(maxlen=20)
         self.error_count = 0
         self.last_error_time = 0
+        self._last_written = {}  # (error_type, message) -> monotonic time written out; insertion order is write order
+        self._suppressed = {}
+        self._sink = None
         self._ensure_log_file()
 
     def _ensure_log_file(self):
         try:
-            with open(config.ERROR_LOG_PATH, "a", encoding="utf-8") as f:
-                f.write(f"\n{'='*70}\nBot started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n{'='*70}\n")
+            self._sink = BackgroundWriter(config.ERROR_LOG_PATH)
+            self._sink.write(f"\n{'='*70}\nBot started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n{'='*70}\n")
             logger.info(f"✓ Error log: {config.ERROR_LOG_PATH}")
         except Exception as e:
             logger.warning(f"Cannot create error log: {e}")
 
+    def _expire_dedup(self, now, ts):
+        """Drops keys older than ERROR_LOG_DEDUP_SEC, writing a repeat count for any that were suppressed."""
+        cutoff = now - config.ERROR_LOG_DEDUP_SEC
+        while self._last_written:
+            key = next(iter(self._last_written))
+            if self._last_written[key] > cutoff: break
+            del self._last_written[key]
+            suppressed = self._suppressed.pop(key, 0)
+            if suppressed and config.LOG_ERRORS_TO_FILE and self._sink:
+                self._sink.write(f"{ts} | {key[0]} | {key[1]} (+{suppressed} repeats suppressed)\n")
+
     def log_error(self, error_type, message, details=""):
         self.error_count += 1
         self.last_error_time = time.time()
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.recent_errors.append({"time": ts, "type": error_type, "message": message})
-        if config.LOG_ERRORS_TO_FILE:
-            try:
-                with open(config.ERROR_LOG_PATH, "a", encoding="utf-8") as f:
-                    f.write(f"{ts} | {error_type} | {message}\n")
-                    if details:
-                        f.write(f"   Details: {details}\n")
-            except Exception:
-                pass
+
+        # Only the file is deduplicated; the console still sees every error.
+        key, now = (error_type, message), time.monotonic()
+        self._expire_dedup(now, ts)
+        if key in self._last_written: self._suppressed[key] = self._suppressed.get(key, 0) + 1
+        else:
+            self._last_written[key] = now
+            if config.LOG_ERRORS_TO_FILE and self._sink:
+                self._sink.write(f"{ts} | {error_type} | {message}\n")
+                if details: self._sink.write(f"   Details: {details}\n")
         if error_type not in getattr(config, "ERRORS_TO_IGNORE_FOR_COOLDOWN", []):
             logger.error(f"{error_type}: {message}")
             if details and config.DEBUG_MODE:
@@ -84,11 +170,50 @@ class ErrorLogger:
 
 error_logger = ErrorLogger()
 
+def _enable_vt_mode():
+    """Turns on ANSI escape handling in a Windows console; False on consoles that can't do it."""
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle, mode = kernel32.GetStdHandle(-11), ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)): return False
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except Exception: return False
+
+# PnL is accumulated as integer micro-USDT; Decimal only appears at the edges.
+_MICROS = 1_000_000
+
+def _to_micros(x): return round(float(x) * _MICROS)
+
 class DisplayManager:
+    # Fixed parts of the frame; each variable section is filled with a single format() call per render.
+    _RULE, _THIN_RULE, _BOTTOM = "╠" + "═" * 78 + "╣", "╠" + "─" * 78 + "╣", "╚" + "═" * 78 + "╝"
+    _HEADER = "\n".join([
+        "╔" + "═" * 78 + "╗",
+        f"║{'⚡ MOMENTUM SNIPER v8.7.2 (STABLE) ⚡':^78}║",
+        _RULE,
+        "║ {status:<76} ║",
+        _THIN_RULE,
+        "║ Balance: ${balance:>10.2f} │ Runtime: {runtime:<10} │ Trades: {trades:<4} ║",
+        "║ P&L: {pnl:>12} │ Win Rate: {win_rate:>5.1f}% │ Avg: {avg:>10} │ Errors: {errors:<4} ║",
+        "║ Signals: Detected {detected:<4} │ Rejected {rejected:<4} " + " " * 28 + "║",
+        _RULE,
+    ])
+    _POSITION = "\n".join([
+        f"║{'ACTIVE POSITION':^78}║",
+        _THIN_RULE,
+        "║ {inst_id:12} │ {color}State: {state:<12}\033[0m │ Age: {age}s " + " " * 23 + "║",
+        "║ Entry: ${entry:.6f} │ Curr: ${current:.6f} │ P&L: {pnl_pct:+.2f}% " + " " * 11 + "║",
+        "║ TP: ${tp:.6f} │ SL: ${sl:.6f} │ R:R: {rr:.2f} " + " " * 5 + "║",
+        "║ Trail: {trail} │ Peak: ${peak:.6f} " + " " * 30 + "║",
+    ])
+    _IDLE = [f"║{'NO ACTIVE POSITION - Scanning for setups...':^78}║", _RULE, f"║{'RECENT TRADES':^78}║", _THIN_RULE]
+
     def __init__(self):
         self.lock = asyncio.Lock()
-        self.start_time = time.time()
-        self.session_pnl = Decimal("0")
+        self.start_time = time.monotonic()
+        self._runtime = (-1, "")
+        self._pnl_micros = 0
         self.total_trades, self.wins, self.losses = 0, 0, 0
         self.recent_trades = deque(maxlen=20)
         self.active_position = None
@@ -98,14 +223,23 @@ class DisplayManager:
         self.current_status = "Initializing..."
         self.signals_detected, self.signals_rejected = 0, 0
         self.sniper_ref = None
+        self._last_lines = None
+        self._console_records = 0
+        self._ansi = os.name != "nt" or _enable_vt_mode()
+        self._last_sig, self._last_forced = None, 0.0
 
-    def format_runtime(self):
-        elapsed = int(time.time() - self.start_time)
-        return f"{elapsed//3600}:{(elapsed%3600)//60:02d}:{elapsed%60:02d}"
+    def format_runtime(self, now=None):
+        elapsed = int((time.monotonic() if now is None else now) - self.start_time)
+        if elapsed != self._runtime[0]:
+            self._runtime = (elapsed, f"{elapsed//3600}:{(elapsed%3600)//60:02d}:{elapsed%60:02d}")
+        return self._runtime[1]
+
+    @property
+    def session_pnl(self): return Decimal(self._pnl_micros) / _MICROS
 
     def update_trade(self, inst_id, pnl, entry_px, exit_px, hold_sec):
         self.total_trades += 1
-        self.session_pnl += Decimal(pnl)
+        self._pnl_micros += _to_micros(pnl)
         if pnl >= 0: self.wins += 1
         else: self.losses += 1
         self.recent_trades.append({
@@ -114,57 +248,77 @@ class DisplayManager:
         })
 
     async def render(self):
+        # Only the copy happens under the lock; formatting and terminal IO run on the snapshot.
         async with self.lock:
-            os.system("cls" if os.name == "nt" else "clear")
-            win_rate = (self.wins / self.total_trades * 100) if self.total_trades > 0 else 0
-            avg_pnl = (self.session_pnl / self.total_trades) if self.total_trades > 0 else Decimal("0")
-            print("╔" + "═" * 78 + "╗")
-            print(f"║{'⚡ MOMENTUM SNIPER v8.7.2 (STABLE) ⚡':^78}║")
-            print("╠" + "═" * 78 + "╣")
-            print(f"║ {self.current_status:<76} ║")
-            print("╠" + "─" * 78 + "╣")
-            print(f"║ Balance: ${float(self.usdt_balance):>10.2f} │ Runtime: {self.format_runtime():<10} │ Trades: {self.total_trades:<4} ║")
-            print(f"║ P&L: {self._fmt_pnl(self.session_pnl):>12} │ Win Rate: {win_rate:>5.1f}% │ Avg: {self._fmt_pnl(avg_pnl):>10} │ Errors: {error_logger.error_count:<4} ║")
-            print(f"║ Signals: Detected {self.signals_detected:<4} │ Rejected {self.signals_rejected:<4} {'':<28}║")
-            print("╠" + "═" * 78 + "╣")
-            if self.active_position:
-                pos = self.active_position
-                age = int(time.time() - pos.get("time", 0))
-                entry = pos.get("entry_price", 0)
-                current = pos.get("current", entry)
-                pnl_pct = ((current - entry) / entry * 100) if entry and entry > 0 else 0
-                pos_state = pos.get('state', 'N/A')
-                state_color = "\033[91m" if "FAILED" in pos_state else "\033[92m"
-                state_reset = "\033[0m"
-                print(f"║{'ACTIVE POSITION':^78}║")
-                print("╠" + "─" * 78 + "╣")
-                print(f"║ {pos.get('inst_id', 'N/A'):12} │ {state_color}State: {pos_state:<12}{state_reset} │ Age: {age}s {'':<23}║")
-                print(f"║ Entry: ${float(entry):.6f} │ Curr: ${float(current):.6f} │ P&L: {pnl_pct:+.2f}% {'':<11}║")
-                print(f"║ TP: ${float(pos.get('tp_price', 0)):.6f} │ SL: ${float(pos.get('sl_price', 0)):.6f} │ R:R: {pos.get('rr', 0):.2f} {'':<5}║")
-                print(f"║ Trail: {'ON' if pos.get('trailing_active') else 'OFF'} │ Peak: ${float(pos.get('peak_price', 0)):.6f} {'':<30}║")
+            status, balance, pnl_micros = self.current_status, self.usdt_balance, self._pnl_micros
+            total_trades, wins = self.total_trades, self.wins
+            detected, rejected = self.signals_detected, self.signals_rejected
+            pos = dict(self.active_position) if self.active_position else None
+            recent = list(self.recent_trades)[-6:]
+            hot_pairs, excluded_pairs = list(self.hot_pairs), list(self.excluded_pairs)
+            armed = list(self.sniper_ref.armed_candidates) if self.sniper_ref else []
+
+        now, wall = time.monotonic(), time.time()
+        # Nothing on screen changed except the clocks, so skip the frame until the forced refresh is due.
+        sig = (status, balance, pnl_micros, total_trades, wins, detected, rejected, error_logger.error_count,
+               pos, hot_pairs, excluded_pairs, armed, ConsoleActivity.records)
+        if sig == self._last_sig and now - self._last_forced < config.DISPLAY_FORCE_REFRESH_SEC: return
+        self._last_sig, self._last_forced = sig, now
+        win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
+        session_pnl = pnl_micros / _MICROS
+        avg_pnl = (session_pnl / total_trades) if total_trades > 0 else 0.0
+        lines = self._HEADER.format(
+            status=status, balance=float(balance), runtime=self.format_runtime(now), trades=total_trades,
+            pnl=self._fmt_pnl(session_pnl), win_rate=win_rate, avg=self._fmt_pnl(avg_pnl), errors=error_logger.error_count,
+            detected=detected, rejected=rejected,
+        ).split("\n")
+        if pos:
+            entry = pos.get("entry_price", 0)
+            current = pos.get("current", entry)
+            pos_state = pos.get('state', 'N/A')
+            lines += self._POSITION.format(
+                inst_id=pos.get('inst_id', 'N/A'), color="\033[91m" if "FAILED" in pos_state else "\033[92m", state=pos_state,
+                age=int(wall - pos.get("time", 0)), entry=float(entry), current=float(current),
+                pnl_pct=float((current - entry) / entry * 100) if entry and entry > 0 else 0.0,
+                tp=float(pos.get('tp_price', 0)), sl=float(pos.get('sl_price', 0)), rr=float(pos.get('rr', 0)),
+                trail='ON' if pos.get('trailing_active') else 'OFF', peak=float(pos.get('peak_price', 0)),
+            ).split("\n")
+        else:
+            lines += self._IDLE
+            if recent:
+                for t in recent:
+                    sym = "✅" if t["win"] else "❌"
+                    lines.append(f"║ {t['time']} {sym} {t['pair']:12} {self._fmt_pnl(t['pnl']):>10} [{t['hold']}s] {'':<27}║")
             else:
-                print(f"║{'NO ACTIVE POSITION - Scanning for setups...':^78}║")
-                print("╠" + "═" * 78 + "╣")
-                print(f"║{'RECENT TRADES':^78}║")
-                print("╠" + "─" * 78 + "╣")
-                if self.recent_trades:
-                    for t in list(self.recent_trades)[-6:]:
-                        sym = "✅" if t["win"] else "❌"
-                        print(f"║ {t['time']} {sym} {t['pair']:12} {self._fmt_pnl(t['pnl']):>10} [{t['hold']}s] {'':<27}║")
-                else:
-                    print(f"║{'No trades yet':^78}║")
-                print("╠" + "═" * 78 + "╣")
-                print(f"║ 🔥 Hot ({len(self.hot_pairs)}): {', '.join(self.hot_pairs[:6]):<60} ║")
-                if hasattr(self, 'sniper_ref') and self.sniper_ref:
-                    armed_count = len(self.sniper_ref.armed_candidates)
-                    if armed_count > 0:
-                        armed_pairs = list(self.sniper_ref.armed_candidates.keys())[:4]
-                        armed_str = ', '.join(armed_pairs)
-                        print(f"║ 🎯 ARMED ({armed_count}): {armed_str:<65} ║")
-                if self.excluded_pairs:
-                    print(f"║ 🚫 Excluded ({len(self.excluded_pairs)}): {', '.join(self.excluded_pairs[:4]):<54} ║")
-            print("╚" + "═" * 78 + "╝")
+                lines.append(f"║{'No trades yet':^78}║")
+            lines.append(self._RULE)
+            lines.append(f"║ 🔥 Hot ({len(hot_pairs)}): {', '.join(hot_pairs[:6]):<60} ║")
+            if armed:
+                lines.append(f"║ 🎯 ARMED ({len(armed)}): {', '.join(armed[:4]):<65} ║")
+            if excluded_pairs:
+                lines.append(f"║ 🚫 Excluded ({len(excluded_pairs)}): {', '.join(excluded_pairs[:4]):<54} ║")
+        lines.append(self._BOTTOM)
+        self._paint(lines)
+
+    def _paint(self, lines):
+        """Writes the frame in one call, rewriting only the rows that changed since the last frame."""
+        if not self._ansi:
+            # Console without VT escape support: clear and redraw the whole frame, as the original renderer did.
+            out = ""
+            if lines != self._last_lines or ConsoleActivity.records != self._console_records:
+                os.system("cls")
+                out = "\n".join(lines) + "\n"
+        elif ConsoleActivity.records != self._console_records or self._last_lines is None or len(lines) != len(self._last_lines):
+            # Something else wrote to the terminal (or the layout changed), so row positions can't be trusted.
+            out = "\x1b[H\x1b[2J" + "\n".join(lines) + "\n"
+        else:
+            out = "".join(f"\x1b[{row};1H\x1b[2K{line}" for row, (line, old) in enumerate(zip(lines, self._last_lines), 1) if line != old)
+            if out: out += f"\x1b[{len(lines) + 1};1H"
+        if out:
+            sys.stdout.write(out)
             sys.stdout.flush()
+        self._last_lines = lines
+        self._console_records = ConsoleActivity.records
 
     def _fmt_pnl(self, pnl):
         return f"{'+' if pnl >= 0 else ''}${float(pnl):.2f}"
@@ -172,65 +326,107 @@ class DisplayManager:
     async def render_loop(self):
         while True:
             await self.render()
-            await asyncio.sleep(1)
+            await asyncio.sleep(config.DISPLAY_REFRESH_SEC)
 
 display = DisplayManager()
 
 class DiagnosticMonitor:
+    """Per-pair counters live in flat arrays indexed by a slot assigned when the pair is subscribed."""
     def __init__(self):
         self.ws_messages_received = 0
-        self.orderbook_updates = defaultdict(int)
-        self.trade_updates = defaultdict(int)
-        self.last_update = defaultdict(float)
+        self._idx, self._names = {}, []
+        self.orderbook_updates = array("Q")
+        self.trade_updates = array("Q")
+        self.last_update = array("d")
+    def register(self, inst_ids):
+        for inst_id in inst_ids:
+            if inst_id in self._idx: continue
+            self._idx[inst_id] = len(self._names)
+            self._names.append(inst_id)
+            self.orderbook_updates.append(0)
+            self.trade_updates.append(0)
+            self.last_update.append(0.0)
     def record_message(self, channel, inst_id):
+        i = self._idx.get(inst_id)
+        if i is None: return
         self.ws_messages_received += 1
-        if channel == "bbo-tbt": self.orderbook_updates[inst_id] += 1
-        elif channel == "trades": self.trade_updates[inst_id] += 1
-        self.last_update[inst_id] = time.time()
+        if channel == "bbo-tbt": self.orderbook_updates[i] += 1
+        elif channel == "trades": self.trade_updates[i] += 1
+        self.last_update[i] = time.time()
     def get_status(self):
         now = time.time()
-        active_pairs = [inst_id for inst_id, last_time in self.last_update.items() if now - last_time < 5]
+        active_pairs = [inst_id for inst_id, last_time in zip(self._names, self.last_update) if now - last_time < 5]
         return {"total_messages": self.ws_messages_received, "active_pairs": len(active_pairs), "active_pair_names": active_pairs[:5]}
 
 diagnostics = DiagnosticMonitor()
 
+class RingBuffer:
+    """Fixed-capacity ring stored column-wise (one float64 array per field); each column's newest values are one contiguous view."""
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        # Every record is written twice (slot and slot + capacity) so tail() never has to concatenate.
+        self._buf = np.zeros((width, 2 * capacity), dtype=np.float64)
+        self._head = 0
+        self._count = 0
+    def append(self, row):
+        self._buf[:, self._head] = row
+        self._buf[:, self._head + self.capacity] = row
+        self._head = (self._head + 1) % self.capacity
+        if self._count < self.capacity: self._count += 1
+    def tail(self, k=None):
+        """(width, k) view of the newest k records; row i is field i, oldest first."""
+        k = self._count if k is None else min(k, self._count)
+        end = self._head + self.capacity
+        return self._buf[:, end - k:end]
+    def __len__(self): return self._count
+
 def safe_decimal(x, default=Decimal("0")):
-    try: return Decimal(str(x))
+    t = type(x)
+    if t is Decimal: return x
+    if t is int: return Decimal(x)
+    try: return Decimal(x if t is str else str(x))
     except: return default
 
 class TradeLogger:
     def __init__(self, path):
         self.path = path
+        self._writer = None
         self._ensure_file()
     def _ensure_file(self):
         if not config.CSV_LOG_TRADES: return
         try:
             is_new_file = not os.path.exists(self.path)
-            with open(self.path, "a", newline="", encoding="utf-8") as f:
-                if is_new_file:
-                    csv.writer(f).writerow(["timestamp", "pair", "entry_px", "exit_px", "size", "pnl_usdt", "pnl_pct", "hold_sec", "exit_type", "tp_bps", "sl_bps", "atr", "imbalance", "breakout_strength"])
+            self._writer = csv.writer(BackgroundWriter(self.path))
+            if is_new_file:
+                self._writer.writerow(["timestamp", "pair", "entry_px", "exit_px", "size", "pnl_usdt", "pnl_pct", "hold_sec", "exit_type", "tp_bps", "sl_bps", "atr", "imbalance", "breakout_strength"])
             if is_new_file: logger.info(f"✓ Trade log: {config.CSV_LOG_PATH}")
         except Exception as e:
             logger.warning(f"Cannot create trade log: {e}")
     def log_trade(self, **kwargs):
-        if not config.CSV_LOG_TRADES: return
+        if not config.CSV_LOG_TRADES or not self._writer: return
         try:
-            with open(self.path, "a", newline="", encoding="utf-8") as f:
-                csv.writer(f).writerow([
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    kwargs.get("pair", ""), f"{kwargs.get('entry_px', 0):.8f}", f"{kwargs.get('exit_px', 0):.8f}",
-                    f"{kwargs.get('size', 0):.8f}", f"{kwargs.get('pnl_usdt', 0):.6f}", f"{kwargs.get('pnl_pct', 0):.4f}",
-                    kwargs.get("hold_sec", 0), kwargs.get("exit_type", ""), kwargs.get("tp_bps", 0),
-                    kwargs.get("sl_bps", 0), kwargs.get("atr", 0), kwargs.get("imbalance", 0),
-                    kwargs.get("breakout_strength", 0),
-                ])
+            self._writer.writerow([
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                kwargs.get("pair", ""), f"{kwargs.get('entry_px', 0):.8f}", f"{kwargs.get('exit_px', 0):.8f}",
+                f"{kwargs.get('size', 0):.8f}", f"{kwargs.get('pnl_usdt', 0):.6f}", f"{kwargs.get('pnl_pct', 0):.4f}",
+                kwargs.get("hold_sec", 0), kwargs.get("exit_type", ""), kwargs.get("tp_bps", 0),
+                kwargs.get("sl_bps", 0), kwargs.get("atr", 0), kwargs.get("imbalance", 0),
+                kwargs.get("breakout_strength", 0),
+            ])
         except Exception as e: error_logger.log_error("TRADE_LOG", "Failed to log", str(e))
 
 trade_logger = TradeLogger(config.CSV_LOG_PATH)
 
+# Order errors caused by our request format never exclude a pair; permanent ones exclude it at once; transient ones are ignored.
+_FORMAT_ERR_CODES = frozenset({"51020", "51111", "51000", "51008", "51024"})
+_PERMANENT_ERR_CODES = frozenset({"51155", "51077", "51001", "51002"})
+_IGNORED_ERR_CODES = frozenset({"-1", "50011", "51014"})
+
 class FailedPairTracker:
     def __init__(self):
         self.failure_counts = defaultdict(int)
+        self._dirty = False
+        self._last_refresh = 0.0
         self.excluded_pairs_timestamps = self._load_from_file()
         self.refresh_excluded_list()
     def _load_from_file(self):
@@ -239,17 +435,28 @@ class FailedPairTracker:
                 with open(config.EXCLUDED_PAIRS_FILE, "r", encoding="utf-8") as f: return json.load(f).get("excluded_pairs", {})
             except: return {}
         return {}
-    def _save_to_file(self):
-        try:
-            tmp = config.EXCLUDED_PAIRS_FILE + ".tmp"
-            with open(tmp, "w", encoding="utf-8") as f: json.dump({"excluded_pairs": self.excluded_pairs_timestamps}, f, indent=2)
-            os.replace(tmp, config.EXCLUDED_PAIRS_FILE)
-        except Exception as e: error_logger.log_error("FILE_SAVE", "Cannot save exclusions", str(e))
+    def _save_to_file(self, excluded=None):
+        # Raises instead of logging: this runs on the IO thread, and the loggers are only safe to touch from the loop.
+        tmp = config.EXCLUDED_PAIRS_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump({"excluded_pairs": excluded if excluded is not None else self.excluded_pairs_timestamps}, f, indent=2)
+        os.replace(tmp, config.EXCLUDED_PAIRS_FILE)
+    async def flusher(self):
+        while True:
+            await asyncio.sleep(config.EXCLUDED_PAIRS_FLUSH_SEC)
+            if self._dirty:
+                self._dirty = False
+                try: await asyncio.get_running_loop().run_in_executor(_io_pool, self._save_to_file, dict(self.excluded_pairs_timestamps))
+                except Exception as e: error_logger.log_error("FILE_SAVE", "Cannot save exclusions", str(e))
+    def flush(self):
+        if self._dirty:
+            self._dirty = False
+            try: self._save_to_file()
+            except Exception as e: error_logger.log_error("FILE_SAVE", "Cannot save exclusions", str(e))
     def refresh_excluded_list(self):
         if not isinstance(self.excluded_pairs_timestamps, dict):
             logger.warning(f"⚠️ Found old or corrupt format in {config.EXCLUDED_PAIRS_FILE}. Resetting exclusions.")
             self.excluded_pairs_timestamps = {}
-        now = time.time()
+        now = self._last_refresh = time.time()
         cool_off_sec = getattr(config, 'AUTO_EXCLUDE_COOL_OFF_HOURS', 1.0) * 3600
         pairs_to_remove = [p for p, ts in self.excluded_pairs_timestamps.items() if now - ts > cool_off_sec]
         if pairs_to_remove:
@@ -257,31 +464,32 @@ class FailedPairTracker:
                 del self.excluded_pairs_timestamps[pair]
                 if pair in self.failure_counts: del self.failure_counts[pair]
                 logger.info(f"✅ Re-enabled pair after cool-off: {pair}")
-            self._save_to_file()
+            self._dirty = True
         display.excluded_pairs = sorted(list(self.excluded_pairs_timestamps.keys()))
+    def _maybe_refresh(self):
+        if time.time() - self._last_refresh >= config.EXCLUDED_PAIRS_REFRESH_SEC: self.refresh_excluded_list()
     def record_failure(self, inst_id, error_code, error_msg):
-        self.refresh_excluded_list()
+        self._maybe_refresh()
         if not config.AUTO_EXCLUDE_FAILED_PAIRS or self.is_excluded(inst_id): return
-        format_error_codes = {"51020", "51111", "51000", "51008", "51024"}
-        if str(error_code) in format_error_codes:
+        code = str(error_code)
+        if code in _FORMAT_ERR_CODES:
             logger.warning(f"⚠️ Order format error for {inst_id} (not excluding): {error_msg}")
             return
-        permanent_codes = {"51155", "51077", "51001", "51002"}
-        if str(error_code) in permanent_codes:
+        if code in _PERMANENT_ERR_CODES:
             self.excluded_pairs_timestamps[inst_id] = time.time()
             self.refresh_excluded_list()
             logger.warning(f"🚫 Excluded {inst_id} (will cool-off): {error_msg}")
-            self._save_to_file()
+            self._dirty = True
             return
-        if str(error_code) in {"-1", "50011", "51014"}: return
+        if code in _IGNORED_ERR_CODES: return
         self.failure_counts[inst_id] += 1
         if self.failure_counts[inst_id] >= config.MAX_FAILURES_PER_PAIR:
             self.excluded_pairs_timestamps[inst_id] = time.time()
             self.refresh_excluded_list()
             logger.warning(f"🚫 Excluded {inst_id} after {self.failure_counts[inst_id]} failures (will cool-off)")
-            self._save_to_file()
+            self._dirty = True
     def is_excluded(self, inst_id):
-        self.refresh_excluded_list()
+        self._maybe_refresh()
         return inst_id in self.excluded_pairs_timestamps
 
 failed_pair_tracker = FailedPairTracker()
@@ -298,6 +506,10 @@ class ClientOrderIDGenerator:
 
 order_id_gen = ClientOrderIDGenerator()
 
+def _ticker_float(t, key):
+    try: return float(t.get(key) or 0)
+    except (TypeError, ValueError): return 0.0
+
 class VolatilePairScanner:
     def __init__(self, order_manager):
         self.order_manager = order_manager
@@ -310,24 +522,30 @@ class VolatilePairScanner:
             if not result or result.get("code") != "0":
                 error_logger.log_error("SCANNER_ERROR", "Failed to get tickers", str(result.get("msg")))
                 return []
-            movers = []
             watchlist = {w.upper() for w in config.WATCHLIST} if hasattr(config, "WATCHLIST") and config.WATCHLIST else None
-            for t in result.get("data", []):
-                try:
-                    inst_id = t["instId"]
-                    if not inst_id.upper().endswith(f"-{config.QUOTE_CCY}"): continue
-                    if watchlist and inst_id.upper() not in watchlist: continue
-                    if inst_id.upper() not in self.order_manager.meta or failed_pair_tracker.is_excluded(inst_id): continue
-                    vol_24h = float(t.get("volCcy24h", 0) or 0)
-                    if vol_24h < config.MIN_ABSOLUTE_24H_VOL_USDT: continue
-                    high, low = float(t.get("high24h", 0) or 0), float(t.get("low24h", 0) or 0)
-                    if high > 0 and low > 0 and ((high - low) / low) * 100 >= config.MIN_24H_VOLATILITY_PCT:
-                        movers.append({"instId": inst_id, "volatility": ((high - low) / low) * 100, "volume": vol_24h})
-                except: continue
-            movers.sort(key=lambda x: (x["volatility"], x["volume"]), reverse=True)
-            self.movers = movers[: config.TOP_N_VOLATILE_PAIRS]
+            data, quote, is_excluded = result.get("data", []), f"-{config.QUOTE_CCY}", failed_pair_tracker.is_excluded
+            min_vol, min_pct, top_n = config.MIN_ABSOLUTE_24H_VOL_USDT, config.MIN_24H_VOLATILITY_PCT, config.TOP_N_VOLATILE_PAIRS
+            ids = np.char.upper(np.array([t.get("instId", "") for t in data], dtype=str))
+            eligible = np.char.endswith(ids, quote) & np.isin(ids, list(self.order_manager.meta))
+            if watchlist: eligible &= np.isin(ids, list(watchlist))
+            tickers = [data[i] for i in np.flatnonzero(eligible) if not is_excluded(data[i]["instId"])]
+            inst_ids = [t["instId"] for t in tickers]
+
+            # Rank the eligible tickers in one vectorized pass.
+            n = len(tickers)
+            high = np.fromiter((_ticker_float(t, "high24h") for t in tickers), np.float64, count=n)
+            low = np.fromiter((_ticker_float(t, "low24h") for t in tickers), np.float64, count=n)
+            vol_24h = np.fromiter((_ticker_float(t, "volCcy24h") for t in tickers), np.float64, count=n)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                vol_pct = np.where(low > 0, (high - low) / low * 100, 0.0)
+            idx = np.flatnonzero((vol_24h >= min_vol) & (high > 0) & (low > 0) & (vol_pct >= min_pct))
+            found = idx.size
+            if found > top_n: idx = idx[np.argpartition(-vol_pct[idx], top_n - 1)[:top_n]]
+            idx = idx[np.lexsort((-vol_24h[idx], -vol_pct[idx]))]
+
+            self.movers = [{"instId": inst_ids[i], "volatility": float(vol_pct[i]), "volume": float(vol_24h[i])} for i in idx]
             self.last_scan = time.time()
-            if len(self.movers) > 0: logger.info(f"📡 Scan found {len(movers)} volatile pairs (top {len(self.movers)} selected)")
+            if len(self.movers) > 0: logger.info(f"📡 Scan found {found} volatile pairs (top {len(self.movers)} selected)")
             return self.movers
         except Exception as e:
             error_logger.log_error("SCANNER_ERROR", "Scan failed", str(e))
@@ -335,25 +553,28 @@ class VolatilePairScanner:
 
 class RiskManager:
     def __init__(self):
-        self.daily_pnl = Decimal("0")
+        self._pnl_micros = 0
+        self._max_loss_micros = _to_micros(str(config.MAX_DAILY_LOSS))
         self.consecutive_losses = 0
         self.last_trade_time = 0
         self.last_loss_time = 0
-        self.pair_trade_times = defaultdict(list)
+        self.pair_trade_times = defaultdict(deque)
     def can_open_position(self, inst_id=None, open_positions=0):
         now = time.time()
         if now - self.last_trade_time < config.COOL_DOWN_AFTER_EXIT_SEC: return False, f"Cooldown ({int(config.COOL_DOWN_AFTER_EXIT_SEC - (now - self.last_trade_time))}s)"
         if self.consecutive_losses > 0 and now - self.last_loss_time < config.COOL_DOWN_AFTER_LOSS_SEC: return False, f"Loss cooldown ({int(config.COOL_DOWN_AFTER_LOSS_SEC - (now - self.last_loss_time))}s)"
-        if self.daily_pnl <= -Decimal(str(config.MAX_DAILY_LOSS)): return False, "Daily loss limit hit"
+        if self._pnl_micros <= -self._max_loss_micros: return False, "Daily loss limit hit"
         if self.consecutive_losses >= config.MAX_CONSECUTIVE_LOSSES: return False, f"Max consecutive losses ({self.consecutive_losses})"
         if open_positions >= int(config.MAX_CONCURRENT_TRADES): return False, f"Max concurrent trades ({open_positions})"
         if inst_id and hasattr(config, "MAX_TRADES_PER_PAIR_PER_HOUR"):
-            recent = [t for t in self.pair_trade_times[inst_id] if now - t < 3600]
-            self.pair_trade_times[inst_id] = recent
+            recent, cutoff = self.pair_trade_times[inst_id], now - 3600
+            while recent and recent[0] <= cutoff: recent.popleft()
             if len(recent) >= config.MAX_TRADES_PER_PAIR_PER_HOUR: return False, f"{inst_id} rate limit"
         return True, ""
+    @property
+    def daily_pnl(self): return Decimal(self._pnl_micros) / _MICROS
     def record_trade(self, inst_id, pnl):
-        self.daily_pnl += Decimal(pnl)
+        self._pnl_micros += _to_micros(pnl)
         self.last_trade_time = time.time()
         self.pair_trade_times[inst_id].append(time.time())
         if pnl < 0:
@@ -371,12 +592,11 @@ def setup_rejection_logger():
         return
     try:
         is_new_file = not os.path.exists(config.REJECTION_LOG_PATH)
-        rejection_log_file = open(config.REJECTION_LOG_PATH, "a", encoding="utf-8", newline="")
+        rejection_log_file = BackgroundWriter(config.REJECTION_LOG_PATH)
         rejection_log_writer = csv.writer(rejection_log_file)
         if is_new_file:
             rejection_log_writer.writerow(["Timestamp", "Pair", "Stage", "Reason", "Details"])
         logger.info(f"✓ Rejection log: {config.REJECTION_LOG_PATH}")
     except Exception as e:
         logger.warning(f"Could not create rejection log: {e}")
-
 setup_rejection_logger()
\ No newline at end of file
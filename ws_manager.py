@@ -1,15 +1,14 @@
 # ws_manager.py
 
 import asyncio
-import json
-import hmac
-import base64
 import time
 import traceback
 import websockets
+import orjson
+import numpy as np
 
 import config
-from utils import logger, error_logger
+from utils import logger, error_logger, diagnostics
 
 class WSManager:
     def __init__(self, sniper, is_private: bool):
@@ -17,24 +16,42 @@ class WSManager:
         self.is_private = is_private
         self.ws = None
         self.should_run = True
-        self.subscriptions = []
+        self.subscriptions = {}  # (channel, instId) -> subscribe arg
         self.initial_pairs = []
+        self.inbox = asyncio.Queue(maxsize=config.WS_INBOX_MAXSIZE)
+        account_update = lambda _inst_id, payload: sniper.handle_account_update(payload)
+        self._handlers = {
+            "trades": sniper.handle_trade_data, "bbo-tbt": self._on_bbo,
+            "orders": account_update, "account": account_update, "orders-algo": account_update,
+        }
 
         if config.DEMO_TRADING == "1":
             self.url = config.WS_URL_DEMO_PRIVATE if is_private else config.WS_URL_DEMO_PUBLIC
         else:
             self.url = config.WS_URL_LIVE_PRIVATE if is_private else config.WS_URL_LIVE_PUBLIC
 
+        if is_private:
+            # The private channel set never changes, so its subscribe frame is serialized once.
+            self._private_args = [
+                {"channel": "account", "ccy": "USDT"},
+                {"channel": "orders", "instType": config.INSTRUMENT_TYPE},
+            ]
+            if config.INSTRUMENT_TYPE != "SPOT":
+                self._private_args.append({"channel": "orders-algo", "instType": config.INSTRUMENT_TYPE})
+            self._private_sub_frame = orjson.dumps({"op": "subscribe", "args": self._private_args}).decode()
+
     async def connect(self):
         try:
-            self.ws = await websockets.connect(self.url, ping_interval=20, ping_timeout=15)
+            self.ws = await websockets.connect(self.url, ping_interval=20, ping_timeout=15, compression=None, max_queue=1024, max_size=2**20)
             
             if self.is_private:
-                ts = str(int(time.time() + self.sniper.order_manager.time_offset))
-                sign = base64.b64encode(hmac.new(config.API_SECRET.encode(), f"{ts}GET/users/self/verify".encode(), "sha256").digest()).decode()
+                om = self.sniper.order_manager
+                ts = str(int(time.time() + om.time_offset))
+                # Same prehash as a REST GET with an empty body, so reuse the order manager's keyed HMAC.
+                sign = om.sign(ts, "GET", "/users/self/verify", b"")
                 login_payload = { "op": "login", "args": [{"apiKey": config.API_KEY, "passphrase": config.API_PASSPHRASE, "timestamp": ts, "sign": sign}] }
-                await self.ws.send(json.dumps(login_payload))
-                login_data = json.loads(await asyncio.wait_for(self.ws.recv(), timeout=10))
+                await self.ws.send(orjson.dumps(login_payload).decode())
+                login_data = orjson.loads(await asyncio.wait_for(self.ws.recv(), timeout=10))
                 
                 if not (login_data.get("event") == "login" and login_data.get("code") == "0"):
                     logger.error(f"❌ Private WebSocket Login Failed: {login_data.get('msg', 'Unknown')}")
@@ -51,37 +68,35 @@ class WSManager:
             error_logger.log_error("WS_CONNECT", f"Failed to connect {'private' if self.is_private else 'public'} WS", traceback.format_exc())
             return False
 
-    async def _send_op(self, op, args):
+    async def _send_frame(self, frame):
         if not self.ws: return False
         try:
-            await self.ws.send(json.dumps({"op": op, "args": args}))
+            await self.ws.send(frame)
             return True
         except websockets.exceptions.ConnectionClosed: return False
 
+    async def _send_op(self, op, args):
+        # Decoded back to str so the frame goes out as text; OKX does not accept binary frames.
+        return await self._send_frame(orjson.dumps({"op": op, "args": args}).decode())
+
     async def subscribe(self, inst_ids):
         if self.is_private:
-            args = [
-                {"channel": "account", "ccy": "USDT"},
-                {"channel": "orders", "instType": config.INSTRUMENT_TYPE},
-            ]
-            if config.INSTRUMENT_TYPE != "SPOT":
-                args.append({"channel": "orders-algo", "instType": config.INSTRUMENT_TYPE})
-
-            if await self._send_op("subscribe", args):
-                self.subscriptions = args
-                subs_str = ', '.join([a['channel'] for a in args])
+            if await self._send_frame(self._private_sub_frame):
+                self.subscriptions = {(a["channel"], a.get("instId")): a for a in self._private_args}
+                subs_str = ', '.join([a['channel'] for a in self._private_args])
                 logger.info(f"✓ Subscribed to private channels: {subs_str}")
             return
 
-        new_subs_ids = [i for i in inst_ids if i not in {s.get("instId") for s in self.subscriptions}]
+        new_subs_ids = [i for i in inst_ids if ("bbo-tbt", i) not in self.subscriptions]
         if not new_subs_ids: return
-        
+        diagnostics.register(new_subs_ids)
+
         for i in range(0, len(new_subs_ids), 20):
             batch = new_subs_ids[i:i+20]
             args = ([{"channel": "trades", "instId": inst} for inst in batch] +
                     [{"channel": "bbo-tbt", "instId": inst} for inst in batch])
             if await self._send_op("subscribe", args):
-                self.subscriptions.extend(args)
+                self.subscriptions.update(((a["channel"], a["instId"]), a) for a in args)
                 logger.info(f"✓ Subscribed to trades & bbo-tbt for {len(batch)} pairs")
                 await asyncio.sleep(0.1)
 
@@ -90,55 +105,87 @@ class WSManager:
         args_to_unsub = ([{"channel": "trades", "instId": i} for i in inst_ids] +
                          [{"channel": "bbo-tbt", "instId": i} for i in inst_ids])
         if await self._send_op("unsubscribe", args_to_unsub):
-            self.subscriptions = [s for s in self.subscriptions if s.get("instId") not in set(inst_ids)]
+            for a in args_to_unsub: self.subscriptions.pop((a["channel"], a["instId"]), None)
             logger.info(f"✓ Unsubscribed from {len(inst_ids)} pairs.")
 
     async def resubscribe(self):
         if self.is_private: await self.subscribe([])
-        elif self.subscriptions: await self._send_op("subscribe", self.subscriptions)
+        elif self.subscriptions: await self._send_op("subscribe", list(self.subscriptions.values()))
 
-    async def run(self):
-        while self.should_run:
-            if not await self.connect():
-                logger.info("Reconnecting in 15 seconds...")
-                await asyncio.sleep(15)
-                continue
-            
-            try:
-                while self.should_run:
-                    msg = await self.ws.recv()
-                    if msg == 'pong': continue
-                    data = json.loads(msg)
-
-                    if "event" in data:
-                        event = data.get("event")
-                        if event == "error":
-                            error_logger.log_error("WS_ERROR", data.get("msg", "Unknown WS Error"), str(data))
-                        elif event in ["subscribe", "unsubscribe", "login"] and config.DEBUG_MODE:
-                            logger.debug(f"WS Event: {data}")
-                        continue
-
-                    if "arg" in data and "data" in data:
-                        arg, payload = data["arg"], data["data"]
-                        channel = arg.get("channel")
-                        
-                        if channel == "trades": await self.sniper.handle_trade_data(arg.get("instId"), payload)
-                        elif channel == "bbo-tbt": await self.sniper.handle_bbo_data(arg.get("instId"), payload)
-                        elif channel in ["orders", "account", "orders-algo"]: await self.sniper.handle_account_update(payload)
-                        continue
-                        
-            except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError) as e:
-                logger.warning(f"WS {'Private' if self.is_private else 'Public'} disconnected: {type(e).__name__}.")
+    @staticmethod
+    def _parse_bbo(payload):
+        """(best_bid, best_ask, bids, asks) with (N, 2) float64 [px, sz] arrays, or None if either side is missing."""
+        try:
+            book = payload[0]
+            bids, asks = book.get("bids"), book.get("asks")
+            if not bids or not asks or not bids[0] or not asks[0]: return None
+            bids, asks = np.array(bids, dtype=np.float64)[:, :2], np.array(asks, dtype=np.float64)[:, :2]
+            return float(bids[0, 0]), float(asks[0, 0]), bids, asks
+        except (KeyError, IndexError, ValueError, TypeError) as e:
+            if config.DEBUG_MODE: logger.debug(f"Error parsing BBO: {e} | Data: {payload}")
+            return None
+
+    async def _dispatch(self, data):
+        if "event" in data:
+            event = data.get("event")
+            if event == "error":
+                error_logger.log_error("WS_ERROR", data.get("msg", "Unknown WS Error"), str(data))
+            elif event in ["subscribe", "unsubscribe", "login"] and config.DEBUG_MODE:
+                logger.debug(f"WS Event: {data}")
+            return
+
+        if "arg" in data and "data" in data:
+            arg = data["arg"]
+            handler = self._handlers.get(arg.get("channel"))
+            if handler: await handler(arg.get("instId"), data["data"])
+
+    async def _on_bbo(self, inst_id, payload):
+        book = self._parse_bbo(payload)
+        if book: await self.sniper.handle_bbo_data(inst_id, *book)
+
+    async def _consume(self):
+        """Parses and dispatches frames queued by the socket reader in run()."""
+        get, loads, dispatch = self.inbox.get, orjson.loads, self._dispatch
+        while True:
+            msg = await get()
+            try: await dispatch(loads(msg))
             except Exception:
-                error_logger.log_error("WS_LOOP", "Unhandled error", traceback.format_exc())
-            finally:
-                if self.ws:
-                    try: await self.ws.close()
-                    except: pass
-                logger.info("Reconnecting in 15 seconds...")
-                await asyncio.sleep(15)
+                error_logger.log_error("WS_DISPATCH", "Unhandled error", traceback.format_exc())
+
+    async def run(self):
+        consumer = asyncio.create_task(self._consume())
+        try:
+            while self.should_run:
+                if not await self.connect():
+                    logger.info("Reconnecting in 15 seconds...")
+                    await asyncio.sleep(15)
+                    continue
+
+                try:
+                    # The reader only queues raw frames; once the inbox is full it stops reading, so backpressure reaches the socket.
+                    recv, put = self.ws.recv, self.inbox.put
+                    while self.should_run:
+                        msg = await recv()
+                        if msg != 'pong': await put(msg)
+
+                except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError) as e:
+                    logger.warning(f"WS {'Private' if self.is_private else 'Public'} disconnected: {type(e).__name__}.")
+                except Exception:
+                    error_logger.log_error("WS_LOOP", "Unhandled error", traceback.format_exc())
+                finally:
+                    if self.ws:
+                        try: await self.ws.close()
+                        except: pass
+                    if self.should_run:
+                        logger.info("Reconnecting in 15 seconds...")
+                        await asyncio.sleep(15)
+        finally:
+            consumer.cancel()
 
     async def stop(self):
         self.should_run = False
-        if self.ws: await self.ws.close()
+        if self.ws:
+            try: await self.ws.close()
+            except: pass
+            self.ws = None
         logger.info(f"WebSocket {'Private' if self.is_private else 'Public'} stopped.")
\ No newline at end of file